@@ -27,6 +27,38 @@ workspace_pattern_list = {
     "special:browser": " ",
 }
 
+# Fill the launcher's first page, realize its window and decode its icons while the shell is idle after startup,
+# so the first toggle doesn't pay for it. Costs some memory for a launcher you may never open.
+LAUNCHER_PREWARM = False
+
+# Trace the memory allocated by each plugin (shown by the `plugin-stats` launcher command).
+# tracemalloc slows down every allocation in the shell and plugins are imported one by one, keep it off unless profiling.
+PLUGIN_PROFILE_MEMORY = False
+
+# Reload a plugin as soon as a file in its directory changes. Watches the whole plugin tree, meant for plugin development.
+PLUGIN_HOT_RELOAD = False
+
+# Run launcher plugins that support it (`"out_of_process": true` in their manifest) in a separate process,
+# so a blocking or crashing plugin can't freeze the shell. Costs a second Python process once one of them is used.
+PLUGIN_OUT_OF_PROCESS = False
+
+# Milliseconds a plugin callback may block the main loop. Half a frame at 60Hz.
+PLUGIN_FRAME_BUDGET_MS = 8
+# Plugins going over budget this many times within the window (in seconds) are reported with stack samples
+PLUGIN_BUDGET_STRIKES = 5
+PLUGIN_BUDGET_WINDOW = 60
+# Also unload them until they're reloaded
+PLUGIN_BUDGET_AUTO_DISABLE = False
+
+# Hyprland events arriving within this many milliseconds are notified to widgets as one change.
+# A plain time window started by the first event, not aligned to frames (the state has no frame clock).
+HYPRLAND_EVENT_COALESCE_MS = 16
+
+# Threads running background jobs for the shell and its plugins. One is always kept for interactive jobs.
+JOB_WORKERS = 4
+# Processes for CPU bound jobs, started on the first one. 0 disables the process pool.
+JOB_PROCESS_WORKERS = 2
+
 toolbar_plugin_order = [
     "media",
     "color_picker",
@@ -1,12 +1,10 @@
 import sys
-import gi
-gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk
 from loguru import logger
 from setproctitle import setproctitle
 from config import SHELL_NAME
 from fabric.utils import get_relative_path
 from modules.shell import Shell
+from utils.icons import IconIndex, get_icon_dirs
 
 if __name__ == "__main__":
     setproctitle(SHELL_NAME)
@@ -26,10 +24,10 @@ if __name__ == "__main__":
         format="<level>{level}</level>::<green>{time:DD-MM-YYYY | HH:mm:ss}</green> -> {message}",
     )
 
-    # Set custom `-symbolic.svg` icons' dir
-    icon_theme = Gtk.IconTheme.get_default()
-    icons_dir = get_relative_path("./data/icons/")
-    icon_theme.append_search_path(icons_dir)
+    # Set custom `-symbolic.svg` icons' dir. The shell's and the plugins' icons are merged in a single directory
+    icon_index = IconIndex.get_instance()
+    icon_index.update(get_icon_dirs(get_relative_path(".")))
+    icon_index.install()
 
     shell = Shell(SHELL_NAME)
     shell.run()
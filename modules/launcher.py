@@ -1,20 +1,124 @@
-import operator, gi
-gi.require_version("Gtk", "3.0")
+import time, gi
+gi.require_versions({"Gtk": "3.0", "Gdk": "3.0"})
+from gi.repository import Gdk, GdkPixbuf, GLib, Gtk
 from collections.abc import Iterator
-from typing import Callable, Dict, Tuple
-from fabric.utils import DesktopApp, get_desktop_applications, idle_add, remove_handler
+from loguru import logger
+from typing import Any, Callable, Dict, List, Tuple
 from fabric.widgets.box import Box
 from fabric.widgets.button import Button
 from fabric.widgets.entry import Entry
 from fabric.widgets.image import Image
 from fabric.widgets.label import Label
-from fabric.widgets.scrolledwindow import ScrolledWindow
 from fabric.widgets.wayland import WaylandWindow as Window
-from utils.plugins import LauncherCommandType
+from services.applications import ApplicationEntry, ApplicationIndex
+from utils.cancellation import CancellationToken
+from utils.icons import IconCache
+from utils.jobs import Job, JobPriority
+from utils.latency import LatencyRecorder
+from utils.plugins import LauncherAction, LauncherCommandType, LauncherEntry
+from utils.search import IncrementalSearch, SearchIndex, SearchResults
+from utils.services import get_job_manager
+from utils.trie import PrefixTrie
 from widgets.tag_entry import TagEntry
+from widgets.virtual_list import VirtualList
+
+SLOT_HEIGHT = 44
+SLOT_ICON_SIZE = 32
+# Plugin command factories run as interactive jobs and are abandoned after this long
+COMMAND_DEADLINE = 3000
+# Results are rendered one page at a time
+RESULTS_PAGE_SIZE = 50
+# Shown until the app's icon is decoded
+SLOT_PLACEHOLDER_ICON = "application-x-executable"
+
+class LauncherSlot(Button):
+    """A recyclable launcher row. Shows either an `ApplicationEntry` or a `LauncherEntry`."""
+
+    def __init__(self, on_activate: Callable[[Any], None], icon_cache: IconCache, **kwargs):
+        super().__init__(style_classes="launcher-button", **kwargs)
+
+        self.item: Any = None
+        self._icon_cache = icon_cache
+        self._icon: str | None = None
+
+        self.image = Image(h_align="start", size=SLOT_ICON_SIZE)
+        self.title = Label(h_align="start", ellipsization="end")
+        # Command results are mostly in their description, so it is shown in the row and not only on hover
+        self.description = Label(h_align="start", ellipsization="end", style_classes="launcher-slot-description")
+        self.label = Label(v_align="center", h_align="end", style_classes="launcher-slot-label")
+
+        self.add(
+            Box(
+                orientation="h",
+                spacing=12,
+                children=[
+                    self.image,
+                    Box(orientation="v", v_align="center", h_expand=True, children=[self.title, self.description]),
+                    self.label,
+                ],
+            )
+        )
+        self.connect("clicked", lambda *_: on_activate(self.item))
+
+    def bind(self, item: Any):
+        self.item = item
+
+        if isinstance(item, LauncherEntry):
+            self.image.set_from_icon_name(item.icon or "system-run-symbolic", SLOT_ICON_SIZE)
+            self.title.set_label(item.title)
+            self.label.set_label(item.label or "")
+            self.label.set_visible(bool(item.label))
+            # Plain descriptions may contain `<` or `&`, which would make GTK reject them as markup
+            if item.description_is_markup:
+                self.description.set_markup(item.description or "")
+                self.set_tooltip_markup(item.description or None)
+            else:
+                self.description.set_text(item.description or "")
+                self.set_tooltip_text(item.description or None)
+            self.description.set_visible(bool(item.description))
+            return
+
+        self._bind_icon(item.icon_name)
+        self.title.set_label(item.display_name or "Unknown")
+        self.description.set_visible(False)
+        self.label.set_visible(False)
+        self.set_tooltip_text(item.description)
+
+
+    def _bind_icon(self, icon: str | None):
+        self._icon = icon
+        scale = self.get_scale_factor()
+        pixbuf = self._icon_cache.request(
+            icon, SLOT_ICON_SIZE, scale, lambda pixbuf: self._on_icon_decoded(icon, pixbuf)
+        )
+        if pixbuf is not None:
+            self._set_icon_pixbuf(pixbuf, scale)
+        else:
+            self.image.set_from_icon_name(SLOT_PLACEHOLDER_ICON, SLOT_ICON_SIZE)
+
+    def _on_icon_decoded(self, icon: str | None, pixbuf: GdkPixbuf.Pixbuf | None):
+        # The slot may have been rebound to another item while the icon was decoding
+        if pixbuf is not None and icon == self._icon:
+            self._set_icon_pixbuf(pixbuf, self.get_scale_factor())
+
+    def _set_icon_pixbuf(self, pixbuf: GdkPixbuf.Pixbuf, scale: int):
+        if scale == 1:
+            return self.image.set_from_pixbuf(pixbuf)
+        self.image.set_from_surface(Gdk.cairo_surface_create_from_pixbuf(pixbuf, scale, None))
+
+
+class LauncherArrangement:
+    """A query being arranged, with its cancellation token and timing."""
+
+    def __init__(self, query: str, keystroke_time: float):
+        self.query = query
+        self.token = CancellationToken()
+        # Time of the first keystroke served by this arrangement
+        self.keystroke_time = keystroke_time
+
 
 class Launcher(Window):
-    def __init__(self, **kwargs):
+    def __init__(self, application_index: ApplicationIndex, **kwargs):
         super().__init__(
             name="launcher",
             layer="top",
@@ -25,29 +129,69 @@ class Launcher(Window):
             all_visible=False,
             **kwargs,
         )
-        self._arranger_handler: int = 0
-        self._all_apps = get_desktop_applications()
+        self._application_index = application_index
+        self._all_apps = self._application_index.get_applications()
+        self._search_index = self._build_search_index(self._all_apps)
+        # Remembers the results for each prefix of the current query
+        self._search = IncrementalSearch(self._search_index)
+        self._application_index.connect("changed", self._on_applications_changed)
 
         self._commands = {}
         self._command_handler = None
+        self._command_completer: Callable[[str], List[str]] | None = None
+        # Commands served by the launcher itself
+        self._builtin_commands: PrefixTrie[Tuple[LauncherCommandType, Callable]] = PrefixTrie({
+            "launcher-stats": (LauncherCommandType.LIST, self._latency_stats_command),
+        })
+
+        self._icon_cache = IconCache.get_instance()
+
+        # Plugin command factories may be slow, so they never run on the main loop
+        self._command_job: Job | None = None
+
+        # Search results currently in the list and how many of them are rendered
+        self._results: SearchResults | None = None
+        self._leading_items: List[Any] = []
+        self._shown_results = 0
+
+        # Keystrokes are coalesced into one arrangement per frame
+        self._frame_handler: int = 0
+        self._pending_query = ""
+        self._pending_keystroke_time: float | None = None
+        self._arrangement: LauncherArrangement | None = None
+
+        self.latency: Dict[str, LatencyRecorder] = {
+            "first_result": LatencyRecorder("Keystroke to first result"),
+            "complete": LatencyRecorder("Keystroke to complete"),
+            "toggle": LatencyRecorder("Toggle to first frame"),
+        }
 
-        self.viewport = Box(spacing=2, orientation="v")
         self.search_entry = Entry(
             name="launcher-prompt",
             placeholder="Search Applications...",
             h_expand=True,
-            notify_text=lambda entry, *_: self.arrange_viewport(entry.get_text()),
+            notify_text=lambda entry, *_: self._on_query_changed(entry.get_text()),
         )
 
         self.tag_entry = TagEntry(
             h_expand=True, placeholder="Tags", available_tags=["tag1", "tag2", "tag3"]
         )
 
-        self.scrolled_window = ScrolledWindow(
+        # The slots are recycled: only the visible ones exist and they're rebound to new results on each query
+        self.results_list = VirtualList(
+            row_factory=lambda: LauncherSlot(self._on_slot_activated, self._icon_cache),
+            row_binder=lambda slot, item: slot.bind(item),
+            row_height=SLOT_HEIGHT,
             min_content_size=(280, 320),
             max_content_size=(280 * 2, 320),
-            child=self.viewport,
         )
+        # Load the next page when scrolling past the last result
+        self.results_list.connect(
+            "edge-reached",
+            lambda _, position: self.show_more_results() if position == Gtk.PositionType.BOTTOM else None,
+        )
+        # Holds the widget returned by `WIDGET` commands
+        self.command_widget_holder = Box(orientation="v", v_expand=True)
 
         self.add(
             Box(
@@ -70,107 +214,322 @@ class Launcher(Window):
                     ),
                     # self.tag_entry,
                     # the actual slots holder
-                    self.scrolled_window,
+                    self.results_list,
+                    self.command_widget_holder,
                 ],
             )
         )
         self.show_all()
+        self.command_widget_holder.hide()
 
         self.search_entry.grab_focus_without_selecting()
         self.hide()
 
-    def arrange_viewport(self, query: str = ""):
-        # reset everything so we can filter current viewport's slots...
-        # remove the old handler so we can avoid race conditions
-        remove_handler(self._arranger_handler) if self._arranger_handler else None
+    def _on_query_changed(self, query: str):
+        if self._pending_keystroke_time is None:
+            self._pending_keystroke_time = time.perf_counter()
+        self._pending_query = query
 
-        # remove all children from the viewport
-        self.viewport.children = []
+        # Whatever is still running for the previous query is stale now
+        if self._arrangement is not None:
+            self._arrangement.token.cancel()
+        if self._command_job is not None:
+            # Dropped if it didn't start yet, its result is discarded otherwise
+            self._command_job.cancel()
+            self._command_job = None
 
-        # make a new iterator containing the filtered apps
-        command = None
-        prompt = ""
-        try:
-            command, prompt = query.split(" ", 1)
-        except:
-            command = query
+        if not self.get_mapped():
+            # No frames to wait for
+            return self._run_arrangement()
 
-        if len(command) > 0 and self._command_handler:
-            command_data: Tuple[LauncherCommandType, Callable] | None = None
-            if (command_data := self._command_handler(command)) is not None:
+        if not self._frame_handler:
+            self._frame_handler = self.add_tick_callback(lambda *_: self._run_arrangement())
+
+    def _run_arrangement(self):
+        self._frame_handler = 0
+        if self._pending_keystroke_time is None:
+            return False
+
+        self._arrangement = LauncherArrangement(self._pending_query, self._pending_keystroke_time)
+        self._pending_keystroke_time = None
+        self.arrange_viewport(self._arrangement.query, self._arrangement.token)
+        return False
+
+    def arrange_viewport(self, query: str = "", token: CancellationToken | None = None):
+        command, _, prompt = query.partition(" ")
+
+        if len(command) > 0:
+            if (command_data := self._builtin_commands.get(command)) is not None:
                 command_type, command_factory = command_data
-                result = command_factory(prompt)
+                self.show_command_result(command_type, command_factory(prompt))
+                self._finish_arrangement(token)
+                return False
 
-                if command_type == LauncherCommandType.SINGLE_ENTRY_COMMAND:
-                    print(result.title, result.label)
-                elif command_type == LauncherCommandType.LIST_COMMAND:
-                    ...
+            command_data: Tuple[LauncherCommandType, Callable] | None = None
+            if self._command_handler and (command_data := self._command_handler(command)) is not None:
+                command_type, command_factory = command_data
+                if command_type in (LauncherCommandType.WIDGET, LauncherCommandType.WIDGET_WITH_CONFIRMATION):
+                    # Widgets can only be built on the main thread
+                    self.show_command_result(command_type, command_factory(prompt))
+                    self._finish_arrangement(token)
                 else:
-                    ...
+                    self._run_command(command, command_type, command_factory, prompt, token or CancellationToken())
                 return False
-        filtered_apps_iter = iter(
-            [
-                app
-                for app in self._all_apps
-                if query.casefold()
-                in (
-                    (app.display_name or "")
-                    + (" " + app.name + " ")
-                    + (app.generic_name or "")
-                ).casefold()
-            ]
-        )
-        should_resize = operator.length_hint(filtered_apps_iter) == len(self._all_apps)
-
-        # all aboard...
-        # start the process of adding slots with a lazy executor
-        # using this method makes the process of adding slots way more less
-        # resource expensive without blocking the main thread and resulting in a lock
-        self._arranger_handler = idle_add(
-            lambda *args: self.add_next_application(*args)
-            or (self.resize_viewport() if should_resize else False),
-            filtered_apps_iter,
-            pin=True,
-        )
 
+        # Commands can't contain spaces, so only complete while the query is a single word
+        completions = self._bake_command_completions(command) if command and not prompt and query == command else []
+        self.show_search_results(self._search.results(query), completions)
+        self._finish_arrangement(token)
         return False
 
-    def add_next_application(self, apps_iter: Iterator[DesktopApp]):
-        if not (app := next(apps_iter, None)):
+    def _run_command(
+        self,
+        command: str,
+        command_type: LauncherCommandType,
+        command_factory: Callable,
+        prompt: str,
+        token: CancellationToken,
+    ):
+        """
+            Run a plugin command factory as an interactive job and show its result when it's done, unless it was superseded.
+            Factories may also return an iterator of batches, which are shown as they arrive. A batch is a list of entries,
+            or a single entry that replaces the previous one for `SINGLE_ENTRY` commands.
+        """
+        deadline = CancellationToken()
+        deadline_handler = 0
+        single_entry = command_type in (LauncherCommandType.SINGLE_ENTRY, LauncherCommandType.SINGLE_ENTRY_WITH_CONFIRMATION)
+        streamed: List[Any] = []
+        streaming = False
+
+        def clear_deadline() -> bool:
+            # False if the deadline already passed
+            nonlocal deadline_handler
+            if deadline.cancelled:
+                return False
+            if deadline_handler:
+                GLib.source_remove(deadline_handler)
+                deadline_handler = 0
+            return True
+
+        def on_deadline():
+            deadline.cancel()
+            if not token.cancelled:
+                logger.warning(f"[Launcher] Command `{command}` didn't finish in {COMMAND_DEADLINE}ms.")
+                self.show_results([self._bake_message_entry(f"`{command}` timed out", "dialog-warning-symbolic")])
             return False
 
-        self.viewport.add(self.bake_application_slot(app))
-        return True
+        def on_batch(batch: Any):
+            nonlocal streaming
+            # The deadline only applies to the first batch
+            if token.cancelled or not clear_deadline():
+                return False
+
+            if single_entry:
+                streamed[:] = [batch] if batch is not None else []
+            else:
+                streamed.extend(batch or [])
+
+            self._results = None
+            self._set_list_items(list(streamed), keep_scroll=streaming)
+            if not streaming:
+                streaming = True
+                self._finish_arrangement(token)
+            return False
 
-    def resize_viewport(self):
-        self.scrolled_window.set_min_content_width(
-            self.viewport.get_allocation().width  # type: ignore
+        def run_factory(job: Job):
+            result = command_factory(prompt)
+            if not isinstance(result, Iterator):
+                return result
+
+            # Let streams stop waiting for their next batch when the query changes
+            if callable(cancel := getattr(result, "cancel", None)):
+                token.add_callback(cancel)
+            for batch in result:
+                if token.cancelled:
+                    break
+                GLib.idle_add(on_batch, batch)
+            return result
+
+        def on_done(result: Any):
+            if token.cancelled or not clear_deadline():
+                return
+
+            if isinstance(result, Iterator):
+                # The batches were shown already
+                if streaming:
+                    return
+                self.show_results([])
+            else:
+                self.show_command_result(command_type, result)
+            self._finish_arrangement(token)
+
+        def on_error(error: Exception):
+            if token.cancelled or not clear_deadline():
+                return
+
+            logger.warning(f"[Launcher] Command `{command}` failed: {error}")
+            self.show_results([self._bake_message_entry(f"`{command}` failed: {error}", "dialog-error-symbolic")])
+            self._finish_arrangement(token)
+
+        deadline_handler = GLib.timeout_add(COMMAND_DEADLINE, on_deadline)
+        # Results are delivered on the main loop
+        self._command_job = get_job_manager().create_job(
+            run_factory, owner="launcher", priority=JobPriority.INTERACTIVE, on_done=on_done, on_error=on_error
         )
+
+    def _bake_command_completions(self, prefix: str) -> List[LauncherEntry]:
+        commands = [command for command, _ in self._builtin_commands.complete(prefix)]
+        if self._command_completer is not None:
+            commands += self._command_completer(prefix)
+
+        return [
+            LauncherEntry(
+                icon="utilities-terminal-symbolic",
+                title=command,
+                description_label=f"Run `{command}`",
+                label="Command",
+                actions=[LauncherAction("Complete", "enter", self.launch, (f"{command} ",))],
+            )
+            for command in commands
+        ]
+
+    def _bake_message_entry(self, message: str, icon: str) -> LauncherEntry:
+        return LauncherEntry(icon=icon, title=message, description_label=message, label="Launcher")
+
+    def _finish_arrangement(self, token: CancellationToken | None):
+        arrangement = self._arrangement
+        if token is None or arrangement is None or arrangement.token is not token or token.cancelled:
+            return
+
+        self.latency["first_result"].record((time.perf_counter() - arrangement.keystroke_time) * 1000)
+
+        # Complete means the results made it to the screen
+        self._record_after_next_frame(self.latency["complete"], arrangement.keystroke_time, token)
+
+    def _record_after_next_frame(self, recorder: LatencyRecorder, start_time: float, token: CancellationToken | None = None):
+        """Record the time from `start_time` until the next frame is painted, unless `token` gets cancelled meanwhile."""
+        frame_clock = self.get_frame_clock() if self.get_mapped() else None
+        if frame_clock is None:
+            recorder.record((time.perf_counter() - start_time) * 1000)
+            return
+
+        def on_after_paint(clock):
+            clock.disconnect(handler_id)
+            if token is None or not token.cancelled:
+                recorder.record((time.perf_counter() - start_time) * 1000)
+
+        handler_id = frame_clock.connect("after-paint", on_after_paint)
+
+    def show_results(self, items: List[Any]):
+        self._results = None
+        self._set_list_items(items)
+
+    def show_search_results(self, results: SearchResults, leading_items: List[Any] | None = None):
+        """
+        Show the first page of `results`.
+
+        :param results: Search results
+        :param leading_items: Items shown above the results, e.g. command completions
+        """
+        self._results = results
+        self._leading_items = leading_items or []
+        self._shown_results = 0
+        self.show_more_results()
+
+    def show_more_results(self):
+        results = self._results
+        if results is None or (self._shown_results > 0 and self._shown_results >= len(results)):
+            return
+
+        keep_scroll = self._shown_results > 0
+        self._shown_results = min(self._shown_results + RESULTS_PAGE_SIZE, len(results))
+        # Only the shown results get sorted. The next pages are ranked when requested.
+        items = self._leading_items + results.page(self._shown_results)
+
+        if (remaining := len(results) - self._shown_results) > 0:
+            items.append(
+                LauncherEntry(
+                    icon="view-more-symbolic",
+                    title="Show more",
+                    description_label=f"{remaining} more results",
+                    actions=[LauncherAction("Show more", "enter", self.show_more_results)],
+                )
+            )
+
+        self._set_list_items(items, keep_scroll)
+
+    def _set_list_items(self, items: List[Any], keep_scroll: bool = False):
+        self.command_widget_holder.hide()
+        self.results_list.show()
+        self.results_list.set_items(items, keep_scroll)
+
+    def show_command_result(self, command_type: LauncherCommandType, result: Any):
+        if command_type in (LauncherCommandType.WIDGET, LauncherCommandType.WIDGET_WITH_CONFIRMATION):
+            for child in self.command_widget_holder.get_children():
+                self.command_widget_holder.remove(child)
+                child.destroy()
+            if result is not None:
+                self.command_widget_holder.add(result)
+            self.results_list.hide()
+            self.command_widget_holder.show_all()
+            return
+
+        if command_type in (LauncherCommandType.SINGLE_ENTRY, LauncherCommandType.SINGLE_ENTRY_WITH_CONFIRMATION):
+            result = [result] if result is not None else []
+        self.show_results(list(result or []))
+
+    def _on_slot_activated(self, item: Any):
+        if isinstance(item, LauncherEntry):
+            # Run the default (`enter`) action
+            action = next((action for action in item.actions or [] if action.keys == "enter"), None)
+            if action is not None:
+                action.action(*(action.data or ()))
+            return
+
+        # Hide right away, the app is spawned once the main loop is free
+        self.hide()
+        self.search_entry.set_text("")
+        GLib.idle_add(self._launch_application, item, priority=GLib.PRIORITY_LOW)
+
+    def _launch_application(self, app: ApplicationEntry):
+        app.launch(lambda message: self._show_launch_error(app, message))
         return False
 
-    def bake_application_slot(self, app: DesktopApp, **kwargs) -> Button:
-        return Button(
-            style_classes="launcher-button",
-            child=Box(
-                orientation="h",
-                spacing=12,
-                children=[
-                    Image(pixbuf=app.get_icon_pixbuf(), h_align="start", size=32),
-                    Label(
-                        label=app.display_name or "Unknown",
-                        v_align="center",
-                        h_align="center",
-                    ),
-                ],
-            ),
-            tooltip_text=app.description,
-            on_clicked=lambda *_: (
-                app.launch(),
-                self.hide(),
-                self.search_entry.set_text(""),
-            ),
-            **kwargs,
-        )
+    def _show_launch_error(self, app: ApplicationEntry, message: str):
+        # The launcher was hidden when the app was activated, bring it back to tell why nothing opened
+        if not self.get_visible():
+            self.toggle()
+        self.show_results([
+            self._bake_message_entry(f"Could not launch {app.display_name or app.name}: {message}", "dialog-error-symbolic")
+        ])
+
+    def _build_search_index(self, apps: List[ApplicationEntry]) -> SearchIndex[ApplicationEntry]:
+        return SearchIndex(apps, lambda app: (app.display_name, app.name, app.generic_name, " ".join(app.keywords)))
+
+    def _on_applications_changed(self, *_):
+        self._all_apps = self._application_index.get_applications()
+        self._search_index = self._build_search_index(self._all_apps)
+        self._search = IncrementalSearch(self._search_index)
+        if self.get_visible():
+            self.arrange_viewport(self.search_entry.get_text())
+
+    def _latency_stats_command(self, prompt: str) -> List[LauncherEntry]:
+        return [
+            LauncherEntry(
+                icon="utilities-system-monitor-symbolic",
+                title=recorder.name,
+                description_label=recorder.describe(),
+                label="Launcher",
+            )
+            for recorder in self.latency.values()
+        ] + [
+            LauncherEntry(
+                icon="image-x-generic-symbolic",
+                title="Icon cache",
+                description_label=self._icon_cache.describe(),
+                label="Launcher",
+            )
+        ]
 
     def set_commands(self, commands: Dict):
         self._commands = commands
@@ -178,14 +537,43 @@ class Launcher(Window):
     def set_command_handler(self, command_handler: Callable):
         self._command_handler = command_handler
 
+    def set_command_completer(self, command_completer: Callable[[str], List[str]]):
+        self._command_completer = command_completer
+
+    def prewarm(self):
+        """
+        Do the work of the first `toggle()` ahead of time, while the shell is idle:
+        fill the first page of results, realize the layer-shell surface and decode the first page's icons.
+        """
+        started_at = time.perf_counter()
+
+        self.arrange_viewport("")
+        self.realize()
+        # Resolve styles and sizes now instead of on the first map
+        self.get_preferred_size()
+
+        scale = self.get_scale_factor()
+        for item in self.results_list.items:
+            if isinstance(item, ApplicationEntry):
+                self._icon_cache.request(item.icon_name, SLOT_ICON_SIZE, scale)
+
+        logger.debug(f"[Launcher] Prewarmed in {(time.perf_counter() - started_at) * 1000:.1f}ms.")
+        return False
+
     def toggle(self):
         visible = self.get_visible()
         if visible:
             return self.set_visible(False)
-        self._all_apps = get_desktop_applications()
-        self.search_entry.set_text(""),
+
+        toggled_at = time.perf_counter()
+        if self.search_entry.get_text():
+            self.search_entry.set_text("")
+        else:
+            # `notify::text` won't fire, so fill the list ourselves
+            self.arrange_viewport("")
         self.search_entry.grab_focus_without_selecting()
-        return self.set_visible(True)
+        self.set_visible(True)
+        self._record_after_next_frame(self.latency["toggle"], toggled_at)
 
     def launch(self, command: str):
         self.search_entry.set_text(command)
@@ -1,12 +1,13 @@
 from loguru import logger
 import gi
 gi.require_versions({"Gtk": "3.0"})
-from gi.repository import Gtk
+from gi.repository import GLib, Gtk
 from fabric.core.application import Application
 from fabric.utils import get_relative_path
-from config import MAIN_MONITOR_ID
+from config import LAUNCHER_PREWARM, MAIN_MONITOR_ID, PLUGIN_HOT_RELOAD
 from modules.launcher import Launcher
 from modules.status_bar import StatusBar
+from services.applications import ApplicationIndex
 from utils.devices import get_all_monitors
 from utils.plugins import PluginManager, ShellContext
 from typing import List
@@ -17,7 +18,8 @@ class Shell(Application):
         name: str,
         *windows: Gtk.Window,
     ):
-        launcher = Launcher()
+        application_index = ApplicationIndex()
+        launcher = Launcher(application_index)
         logger.debug("[Shell] Added `launcher`.")
 
         status_bars: List[StatusBar] = []
@@ -37,25 +39,33 @@ class Shell(Application):
 
         self.status_bars = status_bars
         self.launcher = launcher
-        self.context = ShellContext(self.status_bars, self.launcher)
-
+        self.application_index = application_index
         self.plugin_manager = PluginManager()
+        self.context = ShellContext(self.status_bars, self.launcher, self.plugin_manager)
         self.load_plugins()
 
         self._connect_launcher()
 
+        if PLUGIN_HOT_RELOAD:
+            self.plugin_manager.watch_plugins()
+
+        if LAUNCHER_PREWARM:
+            GLib.idle_add(self.launcher.prewarm, priority=GLib.PRIORITY_LOW)
+
     def load_plugins(self):
         self.plugin_manager.get_plugins()
         self.plugin_manager.initialize_plugins(self.context)
-        # Create a reference of the plugins for each status bar. Not the best idea, but make plugins a lot easier to work with.
-        # TODO: REALLY GOTTA FIX THIS
+        # Each status bar gets its own widgets, but they are views over the state shared through the plugin's toolbar model
         for bar in self.status_bars:
             self._load_toolbar_widgets(bar)
+        self.plugin_manager.log_timings()
 
     def reload_plugins(self):
-        # Remove all plugins and its instances
-        self.plugin_manager.neutralize_plugins()
-        self.load_plugins()
+        # Plugins are reloaded one by one, their toolbar widgets are replaced in place
+        self.plugin_manager.reload_plugins()
+
+    def reload_plugin(self, plugin_name: str) -> bool:
+        return self.plugin_manager.reload_plugin(plugin_name)
 
     def remove_children(self, box: Gtk.Box):
         for child in box.get_children():
@@ -74,6 +84,7 @@ class Shell(Application):
     def _connect_launcher(self):
         self.launcher.set_commands(self.plugin_manager.launcher_commands)
         self.launcher.set_command_handler(self.plugin_manager.handle_launcher_command)
+        self.launcher.set_command_completer(self.plugin_manager.complete_launcher_command)
 
     def toggle_launcher(self):
         self.launcher.toggle()
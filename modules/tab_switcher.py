@@ -2,11 +2,10 @@ import json
 
 import pyscreenshot as ImageGrab
 
-from fabric.hyprland.service import Hyprland
 from fabric.utils import bulk_connect
 from fabric.widgets.wayland import WaylandWindow as Window
+from utils.services import get_hyprland_connection, get_hyprland_state
 
-connection: Hyprland | None = None
 visible_workspaces = {}
 
 IMAGE_DIR = "/tmp/fabric_shell"
@@ -17,14 +16,6 @@ IMAGE_DIR = "/tmp/fabric_shell"
 # hyprctl dispatch focuswindow address:0x<window_address>
 
 
-def get_hyprland_connection() -> Hyprland:
-    global connection
-    if not connection:
-        connection = Hyprland()
-
-    return connection
-
-
 def get_visible_windows():
     pass
 
@@ -32,9 +23,10 @@ def get_visible_windows():
 class TabSwitcher(Window):
     def __init__(self):
         super().__init__(monitor=1, name="tab-switcher")
+        self.connection = get_hyprland_connection()
+        self.state = get_hyprland_state()
 
-        hypr_clients = json.loads(Hyprland.send_command("j/clients").reply)
-        active_client = self.get_active_client(hypr_clients)
+        active_client = self.state.get_active_window()
         print(active_client)
 
         focused_client = {}
@@ -42,7 +34,7 @@ class TabSwitcher(Window):
         focused_address = active_client["address"]
 
         some = json.loads(
-            Hyprland.send_command(
+            self.connection.send_command(
                 f"/dispatch focuswindow address:0x{focused_address}"
             ).reply
         )
@@ -65,9 +57,6 @@ class TabSwitcher(Window):
         #     },
         # )
 
-    def get_active_client(self, clients):
-        return [c for c in clients if c["focusHistoryID"] == 0][0]
-
     # def update_visible_workspaces(self, _, event):
     #     print(event.data)
     #     shot_workspace()
@@ -1,7 +1,7 @@
 from fabric.widgets.box import Box
 from fabric.widgets.label import Label
 from utils.plugins import LauncherPlugin, ToolbarPlugin
-from widgets.common_button import CommonButton
+from widgets.common_button import CommonButton, CommonButtonModel
 
 
 class MyPlugin(ToolbarPlugin):
@@ -28,30 +28,32 @@ class MyPlugin(ToolbarPlugin):
     def get_button_popover(self):
         return self.popover_content
 
-    def register_toolbar_widget(self):
-        # This function is called for each status bar and must return a Gtk.Widget()
-        button = CommonButton(
-            name="example-plugin-button",
+    def create_toolbar_model(self):
+        # This function is called once, after `initialize`. The model holds the state shared by the buttons of every status bar
+        return CommonButtonModel(
             icon="arch",
             title="Right click me!",
             label="Launcher opened!",
             revealed=False,  # initialize button with the label hidden
+        )
+
+    def register_toolbar_widget(self):
+        # This function is called for each status bar and must return a Gtk.Widget()
+        # Keep it cheap: the button is only a view of `self.toolbar_model`
+        return CommonButton(
+            name="example-plugin-button",
+            model=self.toolbar_model,
             # Do not use lambda to retrive `*_popover_factory`s! It creates a weak reference that can cause a seg fault.
             r_popover_factory=self.get_button_popover,
-            on_click=lambda: self._on_click(button),
+            on_click=self._on_click,
         )
 
-        return button
-
-    def _on_click(self, button):
+    def _on_click(self):
         launcher = self.shell_context.get_launcher()
         launcher.toggle()
 
-        if launcher.get_visible():
-            button.add_style_class("pressed")
-            button.reveal()
-        else:
-            button.remove_style_class("pressed")
-            button.unreveal()
+        # Updating the model updates the button on every status bar
+        self.toolbar_model.pressed = launcher.get_visible()
+        self.toolbar_model.revealed = launcher.get_visible()
 
         return False
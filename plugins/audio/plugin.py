@@ -1,6 +1,5 @@
 from utils.plugins import ToolbarPlugin
-from widgets.common_button import CommonButton
-from .service import AudioService
+from widgets.common_button import CommonButton, CommonButtonModel
 from .popover import AudioPopover
 
 class InternetStatus(ToolbarPlugin):
@@ -8,8 +7,6 @@ class InternetStatus(ToolbarPlugin):
         self.name = "audio"
         self.description = "Show audio button."
 
-        self.audio_service = AudioService()
-
         self.shell_context = None
 
     def plugin_name(self):
@@ -24,7 +21,8 @@ class InternetStatus(ToolbarPlugin):
     def get_popover_content(self):
         return AudioPopover()
 
+    def create_toolbar_model(self):
+        return CommonButtonModel(icon="volume-max", title="Volume: 100%")
+
     def register_toolbar_widget(self):
-        return CommonButton(
-            name="volume-button", icon="volume-max", title="Volume: 100%"
-        )
+        return CommonButton(name="volume-button", model=self.toolbar_model)
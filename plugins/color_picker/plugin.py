@@ -1,5 +1,5 @@
 from utils.plugins import ToolbarPlugin
-from widgets.common_button import CommonButton
+from widgets.common_button import CommonButton, CommonButtonModel
 
 
 class InternetStatus(ToolbarPlugin):
@@ -18,7 +18,8 @@ class InternetStatus(ToolbarPlugin):
     def initialize(self, shell_context):
         self.shell_context = shell_context
 
+    def create_toolbar_model(self):
+        return CommonButtonModel(icon="color-picker", title="Pick color")
+
     def register_toolbar_widget(self):
-        return CommonButton(
-            name="color-picker-button", icon="color-picker", title="Pick color"
-        )
+        return CommonButton(name="color-picker-button", model=self.toolbar_model)
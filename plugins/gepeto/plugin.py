@@ -11,11 +11,18 @@ def get_gemini_api_key():
     return api_key.strip()
 
 
-from google import genai
+client = None
 
-client = genai.Client(api_key=get_gemini_api_key())
+
+def get_client():
+    # `google.genai` is slow to import, so only pay for it once a question is actually asked
+    global client
+    if client is None:
+        from google import genai
+        client = genai.Client(api_key=get_gemini_api_key())
+    return client
 
 
 def gepeto(q: str) -> str:
-    response = client.models.generate_content(model="gemini-2.0-flash", contents=q)
+    response = get_client().models.generate_content(model="gemini-2.0-flash", contents=q)
     return response
@@ -1,9 +1,9 @@
 import gi
-from fabric.utils import bulk_connect, get_relative_path
+from fabric.utils import get_relative_path
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk
 from utils.plugins import ToolbarPlugin
-from widgets.common_button import CommonButton
+from widgets.common_button import CommonButton, CommonButtonModel
 
 class InternetStatus(ToolbarPlugin):
     def __init__(self):
@@ -24,32 +24,30 @@ class InternetStatus(ToolbarPlugin):
     def initialize(self, shell_context):
         self.shell_context = shell_context
 
-    def register_toolbar_widget(self):
-        # TODO: When loading the plugin, make sure it actually returns a Widget
-        button = CommonButton(
-            name="internet-status-button",
+    def create_toolbar_model(self):
+        return CommonButtonModel(
             icon="ethernet-off",
             title="Ethernet | IPv4: 192.168.0.1",
             label="No internet",
             revealed=False,
-            # on_click=lambda: self._on_click(button),
         )
 
+    def register_toolbar_widget(self):
+        button = CommonButton(name="internet-status-button", model=self.toolbar_model)
+
+        # The provider is shared by the buttons of every status bar
         button_style_context = button.get_style_context()
         button_style_context.add_provider(
             self.css_provider, Gtk.STYLE_PROVIDER_PRIORITY_USER
         )
 
-        bulk_connect(
-            button,
-            {
-                "enter-notify-event": self._on_enter_notify_event,
-                "leave-notify-event": self._on_leave_notify_event,
-            },
-        )
+        # Connected through the context, so the handlers count towards this plugin's main loop budget
+        self.shell_context.connect(button, "enter-notify-event", self._on_enter_notify_event)
+        self.shell_context.connect(button, "leave-notify-event", self._on_leave_notify_event)
 
         return button
 
+    # Hovering only reveals the label of the hovered button, not the ones on the other status bars
     def _on_enter_notify_event(self, widget, event):
         self._on_click(widget)
 
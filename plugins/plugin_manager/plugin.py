@@ -4,13 +4,14 @@ from fabric.widgets.box import Box
 from fabric.widgets.label import Label
 from utils.plugins import LauncherEntry, LauncherPlugin
 from gi.repository import Gtk
-from utils.plugins import LauncherAction, LauncherCommandType
+from utils.plugins import LauncherAction, LauncherCommandType, PLUGIN_PHASES
 
 class PluginEntry:
     def __init__(self):
         self.name = ""
         self.description = ""
         self.location = ""
+        self.state = ""
 
 class PluginManager(LauncherPlugin):
     def __init__(self):
@@ -29,7 +30,9 @@ class PluginManager(LauncherPlugin):
             "pr",
             "plugin-list-ui",
             "plugins-list-ui",
-            "plui"
+            "plui",
+            "plugin-stats",
+            "plugins-stats",
         ]
 
     def plugin_name(self):
@@ -52,7 +55,7 @@ class PluginManager(LauncherPlugin):
                 "pl"
             ):
                 return (
-                    LauncherCommandType.LIST_COMMAND,
+                    LauncherCommandType.LIST,
                     self.list_plugins
                 )
             case (
@@ -61,7 +64,7 @@ class PluginManager(LauncherPlugin):
                 "pr"
             ):
                 return (
-                    LauncherCommandType.SINGLE_ENTRY_COMMAND,
+                    LauncherCommandType.SINGLE_ENTRY,
                     self.reload_plugins_command
                 )
             case (
@@ -70,23 +73,33 @@ class PluginManager(LauncherPlugin):
                 "plui"
             ):
                 return (
-                    LauncherCommandType.WIDGET_COMMAND,
+                    LauncherCommandType.WIDGET,
                     self.list_plugins_ui
                 )
+            case (
+                "plugin-stats" |
+                "plugins-stats"
+            ):
+                return (
+                    LauncherCommandType.LIST,
+                    self.plugin_stats
+                )
             case _:
                 return None
 
 
     def reload_plugins_command(self, prompt: str) -> LauncherEntry:
+        plugin_name = prompt.strip()
         icon: str = ""
-        title: str = "Reload plugins"
+        title: str = f"Reload plugin `{plugin_name}`" if plugin_name else "Reload plugins"
         contents: str = ""
         right_label: str = "Plugin manager"
         actions: List[LauncherAction] = [
             LauncherAction(
-                name="Reload plugins",
+                name=title,
                 keys="enter",
-                action=self.reload_plugins
+                action=self.reload_plugin if plugin_name else self.reload_plugins,
+                data=(plugin_name,) if plugin_name else None
             )
         ]
 
@@ -101,14 +114,45 @@ class PluginManager(LauncherPlugin):
     def reload_plugins(self):
         self.shell_context.reload_plugins()
 
+    def reload_plugin(self, plugin_name: str):
+        self.shell_context.reload_plugin(plugin_name)
+
     def disable_plugin(self, plugin_name):
-        ...
-        # plugin = plugins[plugin_name]
-        # plugin.disable() # whatever
+        self.shell_context.get_plugin_manager().disable_plugin(plugin_name)
+
+    def get_plugin_entries(self) -> List[PluginEntry]:
+        manager = self.shell_context.get_plugin_manager()
+        plugin_entries: List[PluginEntry] = []
+
+        for name, manifest in manager.manifests.items():
+            plugin_entry = PluginEntry()
+            plugin_entry.name = name
+            plugin_entry.description = manifest.description
+            plugin_entry.location = manifest.path
+            if name in manager.disabled_plugins:
+                plugin_entry.state = "Disabled"
+            else:
+                plugin_entry.state = "Loaded" if name in manager.plugins else "Not loaded"
+            plugin_entries.append(plugin_entry)
+
+        # Plugins without a manifest
+        for name, plugin in manager.plugins.items():
+            if name in manager.manifests:
+                continue
+            plugin_entry = PluginEntry()
+            plugin_entry.name = name
+            plugin_entry.description = plugin.plugin_description()
+            plugin_entry.location = f"{manager.plugins_path}/{name}"
+            plugin_entry.state = "Loaded"
+            plugin_entries.append(plugin_entry)
+
+        return sorted(plugin_entries, key=lambda plugin_entry: plugin_entry.name)
 
     def list_plugins(self, prompt: str) -> List[LauncherEntry]:
-        icon = ""
-        plugin_list: List[PluginEntry] = []
+        icon = "application-x-addon-symbolic"
+        plugin_list: List[PluginEntry] = [
+            plugin for plugin in self.get_plugin_entries() if prompt.strip().lower() in plugin.name
+        ]
 
         entries = []
         for plugin in plugin_list:
@@ -117,7 +161,7 @@ class PluginManager(LauncherPlugin):
                     name = "",
                     keys="ctrl+x",
                     action = self.disable_plugin,
-                    data = tuple(plugin.name)
+                    data = (plugin.name,)
                 )
             ]
 
@@ -125,14 +169,39 @@ class PluginManager(LauncherPlugin):
                 LauncherEntry(
                     icon = icon,
                     title = plugin.name,
-                    description_markup = plugin.description,
-                    label = plugin.location,
+                    description_label = plugin.description or plugin.location,
+                    label = plugin.state,
                     actions = actions
                 )
             )
 
         return entries
 
+    def plugin_stats(self, prompt: str) -> List[LauncherEntry]:
+        manager = self.shell_context.get_plugin_manager()
+
+        costs = manager.budget.get_costs()
+
+        entries = []
+        for name, total, phases in manager.get_plugin_stats():
+            if prompt.strip().lower() not in name:
+                continue
+
+            description = " | ".join(
+                ([f"callbacks: {costs[name].describe()}"] if name in costs else [])
+                + [f"{phase}: {phases[phase].describe()}" for phase in PLUGIN_PHASES if phase in phases]
+            )
+            entries.append(
+                LauncherEntry(
+                    icon = "utilities-system-monitor-symbolic",
+                    title = name,
+                    description_label = description,
+                    label = f"{total:.1f}ms",
+                )
+            )
+
+        return entries
+
     def list_plugins_ui(self, prompt: str) -> Gtk.Widget:
         return Box(
             children=Label(label="Hello from plugin!")
@@ -1,5 +1,5 @@
 from utils.plugins import ToolbarPlugin
-from widgets.common_button import CommonButton
+from widgets.common_button import CommonButton, CommonButtonModel
 from .service import FilterService
 from .popover import ScreenFiltersPopover
 
@@ -15,7 +15,7 @@ class ScreenFilters(ToolbarPlugin):
         self._max_brightness = 1.0
         self._min_blf = 2000.0
         self._max_blf = 25000.0
-        self._filter_service = FilterService.get_instance()
+        self._filter_service = None
 
     def get_popover_content(self):
         return ScreenFiltersPopover(self._filter_service)
@@ -28,9 +28,24 @@ class ScreenFilters(ToolbarPlugin):
 
     def initialize(self, shell_context):
         self.shell_context = shell_context
+        self.shell_context.register_service(
+            "screen_filters", FilterService.from_config, teardown=lambda service: service.shader_off()
+        )
+        self._filter_service = self.shell_context.acquire_service("screen_filters")
         self._filter_service.shader_on()
 
+    def create_toolbar_model(self):
+        model = CommonButtonModel(icon="brightness", title=self._get_title(self._filter_service.brightness))
+        # A single subscription for every status bar
+        self.shell_context.connect(
+            self._filter_service, "brightness-changed", lambda _, value: model.set_property("title", self._get_title(value))
+        )
+        return model
+
     def register_toolbar_widget(self):
         return CommonButton(
-            name="screen-filters-button", icon="brightness", title="Screen filters", l_popover_factory=self.get_popover_content
+            name="screen-filters-button", model=self.toolbar_model, l_popover_factory=self.get_popover_content
         )
+
+    def _get_title(self, brightness: float) -> str:
+        return f"Screen filters | Brightness: {round(brightness * 100)}%"
@@ -4,18 +4,14 @@ from config import DEFAULT_BRIGHTNESS_VALUE, DEFAULT_BLUE_LIGHT_FILTER_VALUE, HY
 from fabric.utils import exec_shell_command_async
 
 class FilterService(Service):
-    _instance = None
-
     @classmethod
-    def get_instance(cls):
-        if cls._instance is None:
-            cls._instance = FilterService(
-                DEFAULT_BRIGHTNESS_VALUE,
-                0.5, 1.0,
-                DEFAULT_BLUE_LIGHT_FILTER_VALUE,
-                2000.0, 25000.0
-            )
-        return cls._instance
+    def from_config(cls):
+        return cls(
+            DEFAULT_BRIGHTNESS_VALUE,
+            0.5, 1.0,
+            DEFAULT_BLUE_LIGHT_FILTER_VALUE,
+            2000.0, 25000.0
+        )
 
     @Signal
     def brightness_changed(self, value: float) -> None: ...
@@ -1,5 +1,5 @@
 from utils.plugins import ToolbarPlugin
-from widgets.common_button import CommonButton
+from widgets.common_button import CommonButton, CommonButtonModel
 
 
 class InternetStatus(ToolbarPlugin):
@@ -18,7 +18,8 @@ class InternetStatus(ToolbarPlugin):
     def initialize(self, shell_context):
         self.shell_context = shell_context
 
+    def create_toolbar_model(self):
+        return CommonButtonModel(icon="recorder", title="Record screen")
+
     def register_toolbar_widget(self):
-        return CommonButton(
-            name="screen-recorder-button", icon="recorder", title="Record screen"
-        )
+        return CommonButton(name="screen-recorder-button", model=self.toolbar_model)
@@ -1,5 +1,5 @@
 from utils.plugins import ToolbarPlugin
-from widgets.common_button import CommonButton
+from widgets.common_button import CommonButton, CommonButtonModel
 
 
 class InternetStatus(ToolbarPlugin):
@@ -19,7 +19,8 @@ class InternetStatus(ToolbarPlugin):
     def initialize(self, shell_context):
         self.shell_context = shell_context
 
+    def create_toolbar_model(self):
+        return CommonButtonModel(icon="screenshot", title="Capture screenshot")
+
     def register_toolbar_widget(self):
-        return CommonButton(
-            name="screenshot-button", icon="screenshot", title="Capture screenshot"
-        )
+        return CommonButton(name="screenshot-button", model=self.toolbar_model)
@@ -0,0 +1,333 @@
+import json, os, threading
+import gi
+gi.require_versions({"Gio": "2.0"})
+from gi.repository import Gio, GLib
+from loguru import logger
+from fabric.core.service import Service, Signal
+from config import SHELL_NAME
+from utils.spawn import get_launch_argv, spawn_async
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Set
+
+# Wait a bit before applying file changes. Package managers touch lots of files at once.
+CHANGES_FLUSH_DELAY = 250
+
+# Bump when `ApplicationEntry` changes so old snapshots are discarded
+SNAPSHOT_VERSION = 1
+
+
+def get_applications_dirs() -> List[str]:
+    """Return the XDG `applications` directories ordered by priority (user dir first)."""
+    data_dirs = [GLib.get_user_data_dir(), *GLib.get_system_data_dirs()]
+    return [os.path.join(data_dir, "applications") for data_dir in data_dirs]
+
+
+def get_snapshot_path() -> str:
+    return os.path.join(GLib.get_user_cache_dir(), SHELL_NAME, "applications.json")
+
+
+class ApplicationEntry:
+    """
+        Parsed desktop entry. Holds plain data only, so it can be built on a worker thread and stored in the snapshot.
+        Mirrors the attributes of fabric's `DesktopApp`.
+    """
+
+    def __init__(
+        self,
+        app_id: str,
+        path: str | None = None,
+        name: str | None = None,
+        display_name: str | None = None,
+        generic_name: str | None = None,
+        description: str | None = None,
+        keywords: List[str] | None = None,
+        categories: List[str] | None = None,
+        executable: str | None = None,
+        command_line: str | None = None,
+        icon_name: str | None = None,
+        window_class: str | None = None,
+    ):
+        self.app_id = app_id
+        self.path = path
+        self.name = name or ""
+        self.display_name = display_name
+        self.generic_name = generic_name
+        self.description = description
+        self.keywords = keywords or []
+        self.categories = categories or []
+        self.executable = executable
+        self.command_line = command_line
+        self.icon_name = icon_name
+        self.window_class = window_class
+
+    @classmethod
+    def from_app_info(cls, app_id: str, app_info: Gio.DesktopAppInfo) -> "ApplicationEntry":
+        icon = app_info.get_icon()
+        return cls(
+            app_id=app_id,
+            path=app_info.get_filename(),
+            name=app_info.get_name(),
+            display_name=app_info.get_display_name(),
+            generic_name=app_info.get_generic_name(),
+            description=app_info.get_description(),
+            keywords=list(app_info.get_keywords() or []),
+            categories=[category for category in (app_info.get_categories() or "").split(";") if category],
+            executable=app_info.get_executable(),
+            command_line=app_info.get_commandline(),
+            icon_name=icon.to_string() if icon is not None else None,
+            window_class=app_info.get_startup_wm_class(),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+    def get_app_info(self) -> Gio.DesktopAppInfo | None:
+        if self.path is not None and (app_info := Gio.DesktopAppInfo.new_from_filename(self.path)) is not None:
+            return app_info
+        return Gio.DesktopAppInfo.new(self.app_id)
+
+    def launch(self, on_error: Callable[[str], None] | None = None) -> bool:
+        """Launch the app in a helper process. Never blocks on the app's startup or D-Bus activation."""
+        if (argv := get_launch_argv(self.app_id, self.path)) is None:
+            message = f"no desktop file for `{self.app_id}`"
+            logger.error(f"[ApplicationIndex] Could not launch `{self.app_id}`: {message}")
+            if on_error is not None:
+                on_error(message)
+            return False
+        return spawn_async(argv, on_error)
+
+    def __eq__(self, other):
+        return isinstance(other, ApplicationEntry) and vars(self) == vars(other)
+
+
+def scan_applications() -> Dict[str, ApplicationEntry]:
+    """Parse every visible desktop entry. Doesn't touch GTK, so it is safe to call from a worker thread."""
+    apps: Dict[str, ApplicationEntry] = {}
+    for app_info in Gio.DesktopAppInfo.get_all():
+        if not app_info.should_show():
+            continue
+        if (app_id := app_info.get_id()) is not None:
+            apps[app_id] = ApplicationEntry.from_app_info(app_id, app_info)
+    return apps
+
+
+class ApplicationIndex(Service):
+    """
+        Long-lived index of the installed desktop applications.
+        The index is built once and then updated incrementally from file monitor events,
+        so consumers never have to rescan the applications directories themselves.
+        The parsed catalog is also kept on disk, so a fresh session doesn't have to parse
+        every desktop entry before the launcher can show anything.
+    """
+
+    @Signal
+    def changed(self) -> None: ...
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._applications_dirs = get_applications_dirs()
+        self._snapshot_path = get_snapshot_path()
+        self._apps: Dict[str, ApplicationEntry] = {}
+        self._apps_list: List[ApplicationEntry] | None = None
+
+        self._monitors: Dict[str, Gio.FileMonitor] = {}
+        self._pending_ids: Set[str] = set()
+        self._pending_rebuild = False
+        self._flush_handler = 0
+        # Bumped whenever file changes are applied, so a background rescan can tell it raced with them
+        self._generation = 0
+        # A single worker keeps the snapshot writes in order
+        self._snapshot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="applications-snapshot")
+
+        if self._load_snapshot():
+            # Directory mtimes don't change when an entry is edited in place, so double check in the background
+            self._rescan_in_background()
+        else:
+            self.rebuild()
+        self._watch_applications_dirs()
+
+    def get_applications(self) -> List[ApplicationEntry]:
+        if self._apps_list is None:
+            self._apps_list = list(self._apps.values())
+        return self._apps_list
+
+    def rebuild(self):
+        self._apps = scan_applications()
+        self._apps_list = None
+        self._save_snapshot()
+        logger.debug(f"[ApplicationIndex] Indexed {len(self._apps)} applications.")
+
+    def _rescan_in_background(self):
+        generation = self._generation
+
+        def rescan():
+            apps = scan_applications()
+            GLib.idle_add(self._apply_rescan, apps, generation)
+
+        threading.Thread(target=rescan, name="applications-rescan", daemon=True).start()
+
+    def _apply_rescan(self, apps: Dict[str, ApplicationEntry], generation: int):
+        if generation != self._generation:
+            # File changes were applied while scanning, the scan may predate them. Scan again, it'll include them.
+            logger.debug("[ApplicationIndex] Applications changed during the rescan, rescanning.")
+            self._rescan_in_background()
+            return False
+
+        if apps != self._apps:
+            logger.debug("[ApplicationIndex] Snapshot was out of date, applying rescan.")
+            self._apps = apps
+            self._apps_list = None
+            self.changed()
+        self._save_snapshot()
+        return False
+
+    def _get_dirs_mtimes(self) -> Dict[str, float]:
+        mtimes = {}
+        for applications_dir in self._applications_dirs:
+            if not os.path.isdir(applications_dir):
+                continue
+            for root, _, _ in os.walk(applications_dir):
+                mtimes[root] = os.stat(root).st_mtime
+        return mtimes
+
+    def _load_snapshot(self) -> bool:
+        try:
+            with open(self._snapshot_path, "r") as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError):
+            return False
+
+        if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("mtimes") != self._get_dirs_mtimes():
+            logger.debug("[ApplicationIndex] Snapshot is stale.")
+            return False
+
+        try:
+            apps = [ApplicationEntry(**entry) for entry in snapshot["applications"]]
+        except (KeyError, TypeError):
+            return False
+
+        self._apps = {app.app_id: app for app in apps}
+        self._apps_list = None
+        logger.debug(f"[ApplicationIndex] Loaded {len(apps)} applications from snapshot.")
+        return True
+
+    def _save_snapshot(self):
+        # Walking the directories and writing the JSON happen on the snapshot worker. If files change after the
+        # entries are copied here, their flush saves another snapshot behind this one.
+        applications = [app.to_dict() for app in self._apps.values()]
+        self._snapshot_executor.submit(self._write_snapshot, applications)
+
+    def _write_snapshot(self, applications: List[Dict[str, Any]]):
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "mtimes": self._get_dirs_mtimes(),
+            "applications": applications,
+        }
+        try:
+            os.makedirs(os.path.dirname(self._snapshot_path), exist_ok=True)
+            # Write to a temporary file first so a crash never leaves a truncated snapshot behind
+            temporary_path = f"{self._snapshot_path}.tmp"
+            with open(temporary_path, "w") as snapshot_file:
+                json.dump(snapshot, snapshot_file)
+            os.replace(temporary_path, self._snapshot_path)
+        except OSError as e:
+            logger.warning(f"[ApplicationIndex] Could not save snapshot: {e}")
+
+    def _watch_applications_dirs(self):
+        for applications_dir in self._applications_dirs:
+            self._watch_dir(applications_dir)
+            if not os.path.isdir(applications_dir):
+                continue
+            for root, dirs, _ in os.walk(applications_dir):
+                for dir_name in dirs:
+                    self._watch_dir(os.path.join(root, dir_name))
+
+    def _watch_dir(self, path: str):
+        if path in self._monitors:
+            return
+        try:
+            monitor = Gio.File.new_for_path(path).monitor_directory(
+                Gio.FileMonitorFlags.WATCH_MOVES, None
+            )
+        except GLib.Error as e:
+            logger.warning(f"[ApplicationIndex] Could not watch `{path}`: {e.message}")
+            return
+
+        monitor.connect("changed", self._on_dir_changed)
+        self._monitors[path] = monitor
+
+    def _on_dir_changed(self, _monitor, file: Gio.File, other_file: Gio.File | None, event: Gio.FileMonitorEvent):
+        for changed_file in (file, other_file):
+            if changed_file is None or (path := changed_file.get_path()) is None:
+                continue
+
+            if path.endswith(".desktop"):
+                if (app_id := self._get_desktop_id(path)) is not None:
+                    self._pending_ids.add(app_id)
+            elif event in (Gio.FileMonitorEvent.CREATED, Gio.FileMonitorEvent.MOVED_IN) and os.path.isdir(path):
+                # A new subdirectory may already contain entries
+                self._watch_dir(path)
+                self._pending_rebuild = True
+            elif event in (Gio.FileMonitorEvent.DELETED, Gio.FileMonitorEvent.MOVED_OUT) and path in self._monitors:
+                self._monitors.pop(path).cancel()
+                self._pending_rebuild = True
+
+        if (self._pending_ids or self._pending_rebuild) and not self._flush_handler:
+            self._flush_handler = GLib.timeout_add(CHANGES_FLUSH_DELAY, self._flush_changes)
+
+    def _flush_changes(self):
+        self._flush_handler = 0
+        self._generation += 1
+
+        if self._pending_rebuild:
+            self._pending_rebuild = False
+            self._pending_ids.clear()
+            self.rebuild()
+            self.changed()
+            return False
+
+        updated = False
+        for app_id in self._pending_ids:
+            updated = self._update_application(app_id) or updated
+        self._pending_ids.clear()
+
+        if updated:
+            self._apps_list = None
+            self._save_snapshot()
+            self.changed()
+        return False
+
+    def _update_application(self, app_id: str) -> bool:
+        app_info = None
+        # Entries in higher priority dirs shadow the ones with the same id in lower priority dirs
+        if (path := self._resolve_desktop_file(app_id)) is not None:
+            app_info = Gio.DesktopAppInfo.new_from_filename(path)
+
+        if app_info is None or not app_info.should_show():
+            return self._apps.pop(app_id, None) is not None
+
+        self._apps[app_id] = ApplicationEntry.from_app_info(app_id, app_info)
+        logger.debug(f"[ApplicationIndex] Updated `{app_id}`.")
+        return True
+
+    def _resolve_desktop_file(self, app_id: str) -> str | None:
+        for applications_dir in self._applications_dirs:
+            for relative_path in self._get_candidate_paths(app_id):
+                path = os.path.join(applications_dir, relative_path)
+                if os.path.isfile(path):
+                    return path
+        return None
+
+    def _get_candidate_paths(self, app_id: str) -> List[str]:
+        # Desktop ids replace `/` with `-`, so `kde4-foo.desktop` may live in `kde4/foo.desktop`
+        parts = app_id.split("-")
+        return [
+            os.path.join(*parts[:i], "-".join(parts[i:])) if i else app_id
+            for i in range(len(parts))
+        ]
+
+    def _get_desktop_id(self, path: str) -> str | None:
+        for applications_dir in self._applications_dirs:
+            if path.startswith(applications_dir + os.sep):
+                return os.path.relpath(path, applications_dir).replace(os.sep, "-")
+        return None
@@ -0,0 +1,370 @@
+import json
+from gi.repository import GLib
+from loguru import logger
+from fabric.core.service import Service, Signal
+from fabric.hyprland.service import Hyprland, HyprlandEvent
+from typing import Any, Callable, Dict, List, Set
+from config import HYPRLAND_EVENT_COALESCE_MS
+
+# Parts of the model each event changes. Events carrying a window address also record it in `clients`.
+EVENT_CHANGES: Dict[str, Set[str]] = {
+    "openwindow": {"workspaces"},
+    "closewindow": {"workspaces", "active_window"},
+    "movewindowv2": {"workspaces"},
+    "windowtitlev2": set(),
+    "activewindowv2": {"active_window"},
+    "changefloatingmode": set(),
+    "fullscreen": set(),
+    "workspacev2": {"active_workspace", "monitors"},
+    "focusedmonv2": {"active_workspace", "monitors"},
+    "createworkspacev2": {"workspaces"},
+    "destroyworkspacev2": {"workspaces"},
+    "renameworkspace": {"workspaces", "active_workspace"},
+    "moveworkspacev2": {"workspaces", "monitors"},
+    "activespecialv2": {"monitors"},
+}
+WINDOW_EVENTS = {"openwindow", "closewindow", "movewindowv2", "windowtitlev2", "changefloatingmode"}
+
+
+class HyprlandChanges:
+    """What changed in a `HyprlandState` since its last `changed` signal."""
+
+    __slots__ = ("events", "clients", "active_window", "active_workspace", "workspaces", "monitors", "resynced")
+
+    def __init__(self):
+        self.events: List[str] = []
+        # Addresses of the clients that were opened, closed or modified
+        self.clients: Set[str] = set()
+        self.active_window = False
+        self.active_workspace = False
+        self.workspaces = False
+        self.monitors = False
+        # The whole model was queried again, anything may have changed
+        self.resynced = False
+
+    def affects_active_window(self, address: str | None) -> bool:
+        """Whether the active window, or what is shown about it, may have changed."""
+        return (
+            self.resynced or self.active_window or self.active_workspace or self.workspaces
+            or (address is not None and address in self.clients)
+        )
+
+    def describe(self) -> str:
+        parts = [name for name in ("active_window", "active_workspace", "workspaces", "monitors", "resynced") if getattr(self, name)]
+        if self.clients:
+            parts.append(f"{len(self.clients)} clients")
+        return f"{len(self.events)} events ({', '.join(parts) or 'nothing'})"
+
+
+class HyprlandState(Service):
+    """
+        In-memory copy of Hyprland's clients, workspaces and monitors.
+        It is seeded with one query for each, then kept current from the event socket, so widgets read it without
+        any hyprctl round trip. Events that don't fit the model (e.g. a window we never saw opening) mean it drifted,
+        in which case everything is queried again.
+        The model is updated as soon as an event arrives, but a burst of events (a workspace switch sends four or five)
+        is notified once, with a `HyprlandChanges` summary, at most once per `HYPRLAND_EVENT_COALESCE_MS`.
+    """
+
+    @Signal
+    def changed(self, changes: object) -> None: ...
+
+    def __init__(self, connection: Hyprland, **kwargs):
+        super().__init__(**kwargs)
+        self.connection = connection
+        # Address (`0x...`) -> client, as returned by `j/clients`
+        self._clients: Dict[str, Dict[str, Any]] = {}
+        # ID -> workspace, as returned by `j/workspaces`
+        self._workspaces: Dict[int, Dict[str, Any]] = {}
+        # Name -> monitor, as returned by `j/monitors`
+        self._monitors: Dict[str, Dict[str, Any]] = {}
+        self._active_address: str | None = None
+        self._resync_handler = 0
+        self.resyncs = 0
+        self._changes = HyprlandChanges()
+        self._notify_handler = 0
+        self.notifications = 0
+
+        handlers: Dict[str, Callable[[List[str]], bool]] = {
+            "openwindow": self._on_open_window,
+            "closewindow": self._on_close_window,
+            "movewindowv2": self._on_move_window,
+            "windowtitlev2": self._on_window_title,
+            "activewindowv2": self._on_active_window,
+            "changefloatingmode": self._on_floating_mode,
+            "fullscreen": self._on_fullscreen,
+            "workspacev2": self._on_workspace,
+            "focusedmonv2": self._on_focused_monitor,
+            "createworkspacev2": self._on_create_workspace,
+            "destroyworkspacev2": self._on_destroy_workspace,
+            "renameworkspace": self._on_rename_workspace,
+            "moveworkspacev2": self._on_move_workspace,
+            "activespecialv2": self._on_active_special,
+            "monitoraddedv2": self._on_monitors_changed,
+            "monitorremoved": self._on_monitors_changed,
+            "configreloaded": self._on_monitors_changed,
+        }
+        # Number of arguments of each event, the last one (e.g. a title) may contain commas
+        self._arities = {
+            "openwindow": 4, "closewindow": 1, "movewindowv2": 3, "windowtitlev2": 2, "activewindowv2": 1,
+            "changefloatingmode": 2, "fullscreen": 1, "workspacev2": 2, "focusedmonv2": 2, "createworkspacev2": 2,
+            "destroyworkspacev2": 2, "renameworkspace": 2, "moveworkspacev2": 3, "activespecialv2": 3,
+            "monitoraddedv2": 3, "monitorremoved": 1, "configreloaded": 1,
+        }
+        self._handler_ids = [
+            self.connection.connect(f"event::{name}", self._make_event_handler(name, handler))
+            for name, handler in handlers.items()
+        ]
+
+        self.resync()
+
+    def get_clients(self) -> List[Dict[str, Any]]:
+        return list(self._clients.values())
+
+    def get_client(self, address: str) -> Dict[str, Any] | None:
+        return self._clients.get(address)
+
+    def get_workspaces(self) -> List[Dict[str, Any]]:
+        return sorted(self._workspaces.values(), key=lambda workspace: workspace["id"])
+
+    def get_monitors(self) -> List[Dict[str, Any]]:
+        return sorted(self._monitors.values(), key=lambda monitor: monitor["id"])
+
+    def get_focused_monitor(self) -> Dict[str, Any] | None:
+        return next((monitor for monitor in self._monitors.values() if monitor.get("focused")), None)
+
+    def get_active_window(self) -> Dict[str, Any] | None:
+        return self._clients.get(self._active_address) if self._active_address else None
+
+    def get_active_workspace(self) -> Dict[str, Any] | None:
+        """Workspace shown on the focused monitor."""
+        if (monitor := self.get_focused_monitor()) is None:
+            return None
+        workspace = monitor.get("activeWorkspace", {})
+        return self._workspaces.get(workspace.get("id")) or workspace or None
+
+    def resync(self):
+        """Query every client, workspace and monitor again."""
+        self.resyncs += 1
+        clients = self._query("j/clients")
+        workspaces = self._query("j/workspaces")
+        monitors = self._query("j/monitors")
+        active_window = self._query("j/activewindow")
+
+        self._clients = {client["address"]: client for client in clients or []}
+        self._workspaces = {workspace["id"]: workspace for workspace in workspaces or []}
+        self._monitors = {monitor["name"]: monitor for monitor in monitors or []}
+        self._active_address = active_window.get("address") if isinstance(active_window, dict) else None
+
+        logger.debug(
+            f"[HyprlandState] Synced {len(self._clients)} clients, {len(self._workspaces)} workspaces "
+            f"and {len(self._monitors)} monitors."
+        )
+        self._changes.resynced = True
+        self._schedule_notify()
+
+    def stop(self):
+        for handler_id in self._handler_ids:
+            self.connection.disconnect(handler_id)
+        self._handler_ids.clear()
+        if self._resync_handler:
+            GLib.source_remove(self._resync_handler)
+            self._resync_handler = 0
+        if self._notify_handler:
+            GLib.source_remove(self._notify_handler)
+            self._notify_handler = 0
+
+    def _query(self, command: str) -> Any:
+        try:
+            return json.loads(self.connection.send_command(command).reply.decode())
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"[HyprlandState] Could not query `{command}`: {e}")
+            return None
+
+    def _make_event_handler(self, name: str, handler: Callable[[List[str]], bool]):
+        arity = self._arities[name]
+
+        def on_event(_, event: HyprlandEvent):
+            raw_data = event.raw_data.decode() if isinstance(event.raw_data, bytes) else str(event.raw_data)
+            args = raw_data.split(",", arity - 1)
+            try:
+                applied = len(args) == arity and handler(args)
+            except (KeyError, ValueError) as e:
+                logger.debug(f"[HyprlandState] Could not apply `{name}>>{raw_data}`: {e}")
+                applied = False
+
+            if applied:
+                self._record(name, args)
+            else:
+                self._schedule_resync(f"{name}>>{raw_data}")
+
+        return on_event
+
+    def _record(self, name: str, args: List[str]):
+        changes = self._changes
+        changes.events.append(name)
+        for part in EVENT_CHANGES.get(name, ()):
+            setattr(changes, part, True)
+        if name in WINDOW_EVENTS:
+            changes.clients.add(f"0x{args[0]}")
+        elif name == "fullscreen" and self._active_address is not None:
+            changes.clients.add(self._active_address)
+        self._schedule_notify()
+
+    def _schedule_notify(self):
+        # The first event of a burst starts the timer, the others only add to the summary
+        if not self._notify_handler:
+            self._notify_handler = GLib.timeout_add(HYPRLAND_EVENT_COALESCE_MS, self._notify)
+
+    def _notify(self):
+        self._notify_handler = 0
+        changes, self._changes = self._changes, HyprlandChanges()
+        self.notifications += 1
+        self.changed(changes)
+        return False
+
+    def _schedule_resync(self, reason: str):
+        if self._resync_handler:
+            return
+        logger.debug(f"[HyprlandState] Out of sync after `{reason}`, resyncing.")
+        # Events that arrive in the meantime are covered by the resync
+        self._resync_handler = GLib.idle_add(self._run_resync)
+
+    def _run_resync(self):
+        self._resync_handler = 0
+        self.resync()
+        return False
+
+    def _get_workspace_ref(self, workspace_id: int) -> Dict[str, Any]:
+        workspace = self._workspaces[workspace_id]
+        return {"id": workspace["id"], "name": workspace["name"]}
+
+    # Each handler returns whether the event could be applied
+
+    def _on_open_window(self, args: List[str]) -> bool:
+        address, workspace_name, win_class, title = args
+        workspace = next((w for w in self._workspaces.values() if w["name"] == workspace_name), None)
+        if workspace is None:
+            return False
+        self._clients[f"0x{address}"] = {
+            "address": f"0x{address}",
+            "workspace": {"id": workspace["id"], "name": workspace["name"]},
+            "class": win_class,
+            "title": title,
+            "initialClass": win_class,
+            "initialTitle": title,
+            "floating": False,
+            "fullscreen": 0,
+        }
+        workspace["windows"] = workspace.get("windows", 0) + 1
+        return True
+
+    def _on_close_window(self, args: List[str]) -> bool:
+        address = f"0x{args[0]}"
+        if (client := self._clients.pop(address, None)) is None:
+            return False
+        if (workspace := self._workspaces.get(client["workspace"]["id"])) is not None:
+            workspace["windows"] = max(0, workspace.get("windows", 1) - 1)
+        if self._active_address == address:
+            self._active_address = None
+        return True
+
+    def _on_move_window(self, args: List[str]) -> bool:
+        address, workspace_id, _ = args
+        client = self._clients[f"0x{address}"]
+        old_workspace = self._workspaces.get(client["workspace"]["id"])
+        new_workspace = self._workspaces[int(workspace_id)]
+        if old_workspace is not None:
+            old_workspace["windows"] = max(0, old_workspace.get("windows", 1) - 1)
+        new_workspace["windows"] = new_workspace.get("windows", 0) + 1
+        client["workspace"] = self._get_workspace_ref(int(workspace_id))
+        return True
+
+    def _on_window_title(self, args: List[str]) -> bool:
+        address, title = args
+        self._clients[f"0x{address}"]["title"] = title
+        return True
+
+    def _on_active_window(self, args: List[str]) -> bool:
+        # Empty (or a lone comma, like `activewindow`) when no window is focused
+        address = args[0].strip(",")
+        if not address:
+            self._active_address = None
+            return True
+        if f"0x{address}" not in self._clients:
+            return False
+        self._active_address = f"0x{address}"
+        return True
+
+    def _on_floating_mode(self, args: List[str]) -> bool:
+        address, floating = args
+        self._clients[f"0x{address}"]["floating"] = floating == "1"
+        return True
+
+    def _on_fullscreen(self, args: List[str]) -> bool:
+        # Only tells whether the active window entered or left fullscreen
+        if (client := self.get_active_window()) is not None:
+            client["fullscreen"] = int(args[0])
+        return True
+
+    def _on_workspace(self, args: List[str]) -> bool:
+        workspace_id = int(args[0])
+        if workspace_id not in self._workspaces or (monitor := self.get_focused_monitor()) is None:
+            return False
+        monitor["activeWorkspace"] = self._get_workspace_ref(workspace_id)
+        self._workspaces[workspace_id]["monitor"] = monitor["name"]
+        return True
+
+    def _on_focused_monitor(self, args: List[str]) -> bool:
+        monitor_name, workspace_id = args[0], int(args[1])
+        if monitor_name not in self._monitors or workspace_id not in self._workspaces:
+            return False
+        for monitor in self._monitors.values():
+            monitor["focused"] = monitor["name"] == monitor_name
+        self._monitors[monitor_name]["activeWorkspace"] = self._get_workspace_ref(workspace_id)
+        return True
+
+    def _on_create_workspace(self, args: List[str]) -> bool:
+        workspace_id, name = int(args[0]), args[1]
+        monitor = self.get_focused_monitor()
+        self._workspaces[workspace_id] = {
+            "id": workspace_id,
+            "name": name,
+            # Workspaces are created on the focused monitor, unless a rule says otherwise
+            "monitor": monitor["name"] if monitor is not None else None,
+            "windows": 0,
+        }
+        return True
+
+    def _on_destroy_workspace(self, args: List[str]) -> bool:
+        return self._workspaces.pop(int(args[0]), None) is not None
+
+    def _on_rename_workspace(self, args: List[str]) -> bool:
+        workspace_id, name = int(args[0]), args[1]
+        self._workspaces[workspace_id]["name"] = name
+        for client in self._clients.values():
+            if client["workspace"]["id"] == workspace_id:
+                client["workspace"]["name"] = name
+        for monitor in self._monitors.values():
+            if monitor.get("activeWorkspace", {}).get("id") == workspace_id:
+                monitor["activeWorkspace"]["name"] = name
+        return True
+
+    def _on_move_workspace(self, args: List[str]) -> bool:
+        workspace_id, _, monitor_name = int(args[0]), args[1], args[2]
+        if monitor_name not in self._monitors:
+            return False
+        self._workspaces[workspace_id]["monitor"] = monitor_name
+        return True
+
+    def _on_active_special(self, args: List[str]) -> bool:
+        # Empty workspace ID and name when the special workspace is closed
+        workspace_id, name, monitor_name = args
+        if monitor_name not in self._monitors:
+            return False
+        self._monitors[monitor_name]["specialWorkspace"] = {"id": int(workspace_id) if workspace_id else 0, "name": name}
+        return True
+
+    def _on_monitors_changed(self, _: List[str]) -> bool:
+        # Rare, and changes too much at once (workspaces move, IDs shift) to patch the model
+        return False
@@ -0,0 +1,45 @@
+import random
+from utils.window_patterns import WindowTitleRewriter
+from window_patterns_benchmark import make_patterns, make_windows, match_window_pattern
+
+# Rules that don't survive being combined with others, next to ones that do
+PATTERNS = {
+    "class:a|title:b": "AB",
+    r"title:(q)\1": "BACKREF",
+    r"title:(?P<word>\w+) (?P=word)$": "Twice $1",
+    r"class:(x)?(?(1)y|z)": "Conditional $1",
+    "(?i)class:LOUD": "Loud",
+    r"class:(k)": "K$1$10",
+    r"title:(a)(b)(c)(d)(e)(f)(g)(h)(i)(j)": "$10 $9",
+    r"title:(\$2) (.*)": "$1 $2",
+    "title:(.*) — Browser$": "$1",
+}
+
+WINDOWS = [
+    ("c", "qq", "i"),
+    ("c", "b", "i"),
+    ("c", "hello hello", "i"),
+    ("xy", "t", "i"),
+    ("z", "t", "i"),
+    ("loud", "t", "i"),
+    ("k", "t", "i"),
+    ("c", "abcdefghij", "i"),
+    ("c", "$2 later", "i"),
+    ("c", "Page — Browser", "i"),
+    ("c", "nothing matches this title at all, it is way too long", "i"),
+    (None, None, None),
+]
+
+
+def test_matches_rules_one_by_one():
+    rewriter = WindowTitleRewriter(PATTERNS)
+    for window in WINDOWS:
+        assert rewriter.rewrite(*window) == match_window_pattern(PATTERNS, *window), window
+
+
+def test_matches_rules_one_by_one_at_scale():
+    random.seed(0)
+    patterns = {**PATTERNS, **make_patterns(200)}
+    rewriter = WindowTitleRewriter(patterns)
+    for window in WINDOWS + make_windows(100, 200):
+        assert rewriter.rewrite(*window) == match_window_pattern(patterns, *window), window
@@ -0,0 +1,182 @@
+import sys, threading, time, traceback
+from collections import deque
+from contextlib import contextmanager
+from loguru import logger
+from typing import Callable, Deque, Dict, List, Tuple
+
+# Stack samples taken while a callback runs over budget, and how far apart
+MAX_STACK_SAMPLES = 3
+STACK_SAMPLE_INTERVAL = 0.01
+STACK_DEPTH = 12
+
+
+class PluginCost:
+    """Time spent in a plugin's callbacks, in milliseconds."""
+
+    __slots__ = ("calls", "total", "max", "overruns", "kinds")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.overruns = 0
+        # Kind of callback -> (calls, total)
+        self.kinds: Dict[str, Tuple[int, float]] = {}
+
+    def add(self, kind: str, elapsed: float):
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        calls, total = self.kinds.get(kind, (0, 0.0))
+        self.kinds[kind] = (calls + 1, total + elapsed)
+
+    def copy(self) -> "PluginCost":
+        cost = PluginCost()
+        cost.calls, cost.total, cost.max, cost.overruns = self.calls, self.total, self.max, self.overruns
+        cost.kinds = dict(self.kinds)
+        return cost
+
+    def describe(self) -> str:
+        kinds = ", ".join(f"{kind} {total:.1f}ms/{calls}" for kind, (calls, total) in sorted(self.kinds.items()))
+        return f"{self.total:.1f}ms in {self.calls} callbacks ({kinds}) · max {self.max:.1f}ms · {self.overruns} over budget"
+
+
+class MainLoopBudget:
+    """
+        Times plugin callbacks and holds the ones running on the main loop to a per-frame budget.
+        While a callback runs past the budget, a sampler thread records the main thread's stack, so the report
+        shows where the time went. A plugin going over budget `strikes` times within `window` seconds is logged
+        with those samples and handed to `on_exhausted`.
+    """
+
+    def __init__(
+        self,
+        budget: float,
+        strikes: int,
+        window: float,
+        on_exhausted: Callable[[str], None] | None = None,
+    ):
+        """
+        :param budget: Milliseconds a single main loop callback may take
+        :param strikes: Overruns tolerated within `window`
+        :param window: Seconds
+        :param on_exhausted: Called on the main thread with the name of a plugin that ran out of strikes
+        """
+        self.budget = budget
+        self.strikes = strikes
+        self.window = window
+        self.on_exhausted = on_exhausted
+
+        self._costs: Dict[str, PluginCost] = {}
+        self._overruns: Dict[str, Deque[float]] = {}
+        self._last_samples: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+        self._main_thread_id = threading.main_thread().ident
+        # (plugin, stack samples) of the outermost callback running on the main thread
+        self._watched: Tuple[str, List[str]] | None = None
+        self._busy = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+
+        self._sampler = threading.Thread(target=self._sample_stacks, name="plugin-budget-sampler", daemon=True)
+        self._sampler.start()
+
+    def wrap(self, plugin_name: str, kind: str, callback: Callable) -> Callable:
+        def timed_callback(*args, **kwargs):
+            with self.measure(plugin_name, kind):
+                return callback(*args, **kwargs)
+
+        return timed_callback
+
+    @contextmanager
+    def measure(self, plugin_name: str, kind: str):
+        # Callbacks called from other callbacks are counted, but only the outermost one is held to the budget
+        watch = threading.get_ident() == self._main_thread_id and self._watched is None
+        samples: List[str] = []
+        if watch:
+            self._watched = (plugin_name, samples)
+            self._idle.clear()
+            self._busy.set()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            if watch:
+                self._busy.clear()
+                self._watched = None
+                self._idle.set()
+            self._add(plugin_name, kind, elapsed, samples if watch else None)
+
+    def get_costs(self) -> Dict[str, PluginCost]:
+        with self._lock:
+            return {plugin_name: cost.copy() for plugin_name, cost in self._costs.items()}
+
+    def clear(self, plugin_name: str | None = None):
+        with self._lock:
+            if plugin_name is None:
+                self._costs.clear()
+                self._overruns.clear()
+                self._last_samples.clear()
+            else:
+                self._costs.pop(plugin_name, None)
+                self._overruns.pop(plugin_name, None)
+                self._last_samples.pop(plugin_name, None)
+
+    def _add(self, plugin_name: str, kind: str, elapsed: float, samples: List[str] | None):
+        with self._lock:
+            cost = self._costs.setdefault(plugin_name, PluginCost())
+            cost.add(kind, elapsed)
+            # Only main loop callbacks have a budget
+            if samples is None or elapsed <= self.budget:
+                return
+
+            cost.overruns += 1
+            if samples:
+                self._last_samples[plugin_name] = samples
+
+            now = time.monotonic()
+            overruns = self._overruns.setdefault(plugin_name, deque())
+            overruns.append(now)
+            while now - overruns[0] > self.window:
+                overruns.popleft()
+
+            exhausted = len(overruns) >= self.strikes
+            if exhausted:
+                overruns.clear()
+                samples = self._last_samples.get(plugin_name, [])
+
+        logger.debug(f"[PluginBudget] `{plugin_name}` {kind} callback took {elapsed:.1f}ms (budget {self.budget}ms).")
+        if not exhausted:
+            return
+
+        report = "\n".join(f"Sample {i + 1}:\n{sample}" for i, sample in enumerate(samples)) or "No stack samples."
+        logger.warning(
+            f"[PluginBudget] `{plugin_name}` went over its {self.budget}ms budget {self.strikes} times "
+            f"in {self.window}s. Last {kind} callback took {elapsed:.1f}ms.\n{report}"
+        )
+        if self.on_exhausted is not None:
+            self.on_exhausted(plugin_name)
+
+    def _sample_stacks(self):
+        while True:
+            self._busy.wait()
+            if (watched := self._watched) is None:
+                continue
+
+            # Most callbacks finish in time, in which case this returns early and nothing is sampled
+            if self._idle.wait(self.budget / 1000):
+                continue
+
+            _, samples = watched
+            while len(samples) < MAX_STACK_SAMPLES and self._watched is watched:
+                if (frame := sys._current_frames().get(self._main_thread_id)) is None:
+                    break
+                samples.append("".join(traceback.format_stack(frame, limit=STACK_DEPTH)))
+                del frame
+                if self._idle.wait(STACK_SAMPLE_INTERVAL):
+                    break
+
+            self._idle.wait()
@@ -1,15 +1,13 @@
-import json
-
 import gi
 
 gi.require_versions({"Gtk": "3.0", "Gdk": "3.0"})
 from gi.repository import Gdk, Gtk
 
-from fabric.hyprland.service import Hyprland
+from utils.services import get_hyprland_state
 
 
 def get_all_monitors():
-    return json.loads(Hyprland.send_command("j/monitors").reply)
+    return get_hyprland_state().get_monitors()
 
 
 def get_monitor_geometry(monitor_id: int) -> Gdk.Rectangle | None:
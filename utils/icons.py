@@ -0,0 +1,212 @@
+import hashlib, os, queue, threading
+import gi
+gi.require_versions({"Gtk": "3.0", "GdkPixbuf": "2.0"})
+from gi.repository import GdkPixbuf, Gio, GLib, Gtk
+from collections import OrderedDict
+from loguru import logger
+from typing import Callable, Dict, List, Tuple
+from config import SHELL_NAME
+
+# (icon name or path, size, scale)
+IconKey = Tuple[str, int, int]
+
+
+class IconCache:
+    """
+        Bounded LRU cache of decoded icon pixbufs shared by the whole shell.
+        Icons are resolved to files on the main thread (Gtk.IconTheme isn't thread safe),
+        but decoding happens on a worker thread so SVGs and big PNGs don't stall the main loop.
+    """
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._cache: OrderedDict[IconKey, GdkPixbuf.Pixbuf | None] = OrderedDict()
+        self._pending: Dict[IconKey, List[Callable[[GdkPixbuf.Pixbuf | None], None]]] = {}
+        self._queue: queue.Queue = queue.Queue()
+
+        self._icon_theme = Gtk.IconTheme.get_default()
+        self._icon_theme.connect("changed", lambda *_: self.clear())
+
+        self._worker = threading.Thread(target=self._decode_worker, name="icon-decoder", daemon=True)
+        self._worker.start()
+
+    def request(
+        self,
+        icon: str | None,
+        size: int,
+        scale: int = 1,
+        callback: Callable[[GdkPixbuf.Pixbuf | None], None] | None = None,
+    ) -> GdkPixbuf.Pixbuf | None:
+        """
+        Return the cached pixbuf for `icon`, or `None` and decode it in the background.
+
+        :param icon: Icon name, path or serialized `Gio.Icon`
+        :param size: Logical size in pixels
+        :param scale: Scale factor of the widget that will show the icon
+        :param callback: Called on the main thread with the pixbuf once it is decoded
+        """
+        if not icon:
+            return None
+
+        key: IconKey = (icon, size, scale)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        if key in self._pending:
+            if callback is not None:
+                self._pending[key].append(callback)
+            return None
+
+        if (filename := self._resolve(icon, size, scale)) is None:
+            # Remember missing icons too, so we don't look them up again
+            self._store(key, None)
+            return None
+
+        self._pending[key] = [callback] if callback is not None else []
+        self._queue.put((key, filename, size * scale))
+        return None
+
+    def clear(self):
+        self._cache.clear()
+
+    def describe(self) -> str:
+        return f"{len(self._cache)}/{self.capacity} icons · hits {self.hits} · misses {self.misses} · evictions {self.evictions}"
+
+    def _resolve(self, icon: str, size: int, scale: int) -> str | None:
+        try:
+            gicon = Gio.Icon.new_for_string(icon)
+        except GLib.Error:
+            return None
+
+        icon_info = self._icon_theme.lookup_by_gicon_for_scale(gicon, size, scale, Gtk.IconLookupFlags.FORCE_SIZE)
+        return icon_info.get_filename() if icon_info is not None else None
+
+    def _decode_worker(self):
+        while True:
+            key, filename, pixel_size = self._queue.get()
+            try:
+                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(filename, pixel_size, pixel_size)
+            except GLib.Error as e:
+                logger.warning(f"[IconCache] Could not decode `{filename}`: {e.message}")
+                pixbuf = None
+            GLib.idle_add(self._deliver, key, pixbuf)
+
+    def _deliver(self, key: IconKey, pixbuf: GdkPixbuf.Pixbuf | None):
+        self._store(key, pixbuf)
+        for callback in self._pending.pop(key, []):
+            callback(pixbuf)
+        return False
+
+    def _store(self, key: IconKey, pixbuf: GdkPixbuf.Pixbuf | None):
+        self._cache[key] = pixbuf
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+
+def get_icon_dirs(shell_path: str) -> List[str]:
+    """Return the shell's icon directory followed by the `icons` directories of its plugins."""
+    icon_dirs = [os.path.join(shell_path, "data", "icons")]
+    plugins_path = os.path.join(shell_path, "plugins")
+    if os.path.isdir(plugins_path):
+        for dir_name in sorted(os.listdir(plugins_path)):
+            if not dir_name.startswith("_") and os.path.isdir(icons_path := os.path.join(plugins_path, dir_name, "icons")):
+                icon_dirs.append(icons_path)
+    return icon_dirs
+
+
+class IconIndex:
+    """
+        Single icon directory made of symlinks to the icons of the shell and its plugins.
+        Every path added to the icon theme's search path is scanned on each lookup miss and each rescan,
+        so we add this one instead of one path per plugin. The links are only rewritten when the set of
+        icon files changes.
+    """
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.path.join(GLib.get_user_cache_dir(), SHELL_NAME, "icons")
+        self._signature_path = f"{self.path}.signature"
+        self._installed = False
+
+    def update(self, icon_dirs: List[str]) -> bool:
+        """Make the index match `icon_dirs`, earlier directories win name clashes. Return whether it changed."""
+        icons = self._collect(icon_dirs)
+        signature = hashlib.sha1(
+            "\n".join(f"{name}\0{target}" for name, target in sorted(icons.items())).encode()
+        ).hexdigest()
+        if signature == self._read_signature() and os.path.isdir(self.path):
+            return False
+
+        os.makedirs(self.path, exist_ok=True)
+        for name in os.listdir(self.path):
+            link = os.path.join(self.path, name)
+            if icons.get(name) != (os.readlink(link) if os.path.islink(link) else None):
+                os.unlink(link)
+        for name, target in icons.items():
+            if not os.path.lexists(link := os.path.join(self.path, name)):
+                os.symlink(target, link)
+
+        with open(self._signature_path, "w") as file:
+            file.write(signature)
+        logger.debug(f"[IconIndex] Indexed {len(icons)} icons from {len(icon_dirs)} directories.")
+
+        if self._installed:
+            # The directory keeps its path, the theme notices its new mtime
+            Gtk.IconTheme.get_default().rescan_if_needed()
+        return True
+
+    def install(self):
+        """Add the index to the default icon theme's search path, once."""
+        if self._installed:
+            return
+        icon_theme = Gtk.IconTheme.get_default()
+        if self.path not in icon_theme.get_search_path():
+            icon_theme.append_search_path(self.path)
+        self._installed = True
+
+    def _collect(self, icon_dirs: List[str]) -> Dict[str, str]:
+        icons: Dict[str, str] = {}
+        for icon_dir in icon_dirs:
+            try:
+                entries = sorted(os.scandir(icon_dir), key=lambda entry: entry.name)
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                if entry.name in icons:
+                    logger.warning(f"[IconIndex] `{entry.path}` is shadowed by `{icons[entry.name]}`.")
+                    continue
+                icons[entry.name] = os.path.abspath(entry.path)
+        return icons
+
+    def _read_signature(self) -> str | None:
+        try:
+            with open(self._signature_path) as file:
+                return file.read().strip()
+        except OSError:
+            return None
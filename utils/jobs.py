@@ -0,0 +1,263 @@
+import heapq, itertools, multiprocessing, threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from enum import IntEnum
+from gi.repository import GLib
+from loguru import logger
+from typing import Any, Callable, Dict, List, Tuple
+from config import JOB_WORKERS, JOB_PROCESS_WORKERS
+from utils.cancellation import CancellationToken
+
+
+class JobPriority(IntEnum):
+    # Something the user is waiting for, e.g. the result of a launcher command
+    INTERACTIVE = 0
+    # Indexing, prefetching, cleanups...
+    BACKGROUND = 1
+
+
+class JobState(IntEnum):
+    PENDING = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+    CANCELLED = 4
+
+
+class Job:
+    """
+        Handle of a function running on the `JobManager`.
+        Thread jobs receive it as their first argument, to check `cancelled` and call `report_progress`.
+    """
+
+    def __init__(
+        self,
+        owner: str,
+        function: Callable,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        priority: JobPriority,
+        in_process: bool,
+        on_done: Callable[[Any], None] | None,
+        on_error: Callable[[Exception], None] | None,
+        on_progress: Callable[[float, str | None], None] | None,
+    ):
+        self.owner = owner
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.in_process = in_process
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.state = JobState.PENDING
+        self.token = CancellationToken()
+        self._manager: "JobManager | None" = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.token.cancelled
+
+    def cancel(self):
+        """Drop the job. A running thread job stops when it next checks `cancelled`, its result is discarded anyway."""
+        self.token.cancel()
+
+    def report_progress(self, fraction: float, message: str | None = None):
+        """Report progress from the job's thread. Only the latest report reaches the main loop."""
+        if self._manager is not None and not self.cancelled:
+            self._manager._deliver(self, "progress", (fraction, message))
+
+
+class JobManager:
+    """
+        Runs blocking work off the main loop on a bounded thread pool, and CPU bound work on an optional process pool.
+        Background jobs never take the last free worker, so interactive jobs don't wait behind them.
+        Results, errors and progress are delivered on the main loop, batched into a single idle callback.
+        The shell's instance is the "jobs" service, see `utils.services.get_job_manager`.
+    """
+
+    @classmethod
+    def from_config(cls):
+        return cls(JOB_WORKERS, JOB_PROCESS_WORKERS)
+
+    def __init__(self, workers: int, process_workers: int = 0):
+        self.workers = max(1, workers)
+        self.process_workers = process_workers
+        self._background_limit = max(1, self.workers - 1)
+
+        self._queue: List[Tuple[int, int, Job]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running_background = 0
+        self._jobs: List[Job] = []
+        self._stopped = False
+
+        self._process_pool: ProcessPoolExecutor | None = None
+        self._process_pool_lock = threading.Lock()
+
+        # Job -> [(kind, value)], flushed by a single idle callback
+        self._deliveries: Dict[Job, List[Tuple[str, Any]]] = {}
+        self._delivery_lock = threading.Lock()
+        self._flush_handler = 0
+
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def create_job(
+        self,
+        function: Callable,
+        *args,
+        owner: str = "shell",
+        priority: JobPriority = JobPriority.BACKGROUND,
+        in_process: bool = False,
+        on_done: Callable[[Any], None] | None = None,
+        on_error: Callable[[Exception], None] | None = None,
+        on_progress: Callable[[float, str | None], None] | None = None,
+        **kwargs,
+    ) -> Job:
+        """
+        Queue `function(job, *args, **kwargs)`. Callbacks are called on the main loop, and not at all once cancelled.
+
+        :param in_process: Run `function(*args, **kwargs)` in the process pool instead. It must be picklable
+            and doesn't get the job handle, so it can't report progress or stop early.
+        """
+        if in_process and self.process_workers <= 0:
+            raise ValueError("the process pool is disabled (JOB_PROCESS_WORKERS = 0)")
+
+        job = Job(owner, function, args, kwargs, priority, in_process, on_done, on_error, on_progress)
+        job._manager = self
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("the job manager was shut down")
+            heapq.heappush(self._queue, (priority, next(self._sequence), job))
+            self._jobs.append(job)
+            self._condition.notify()
+        return job
+
+    def cancel_owner(self, owner: str):
+        """Cancel every unfinished job of `owner`, e.g. a plugin being unloaded."""
+        with self._condition:
+            jobs = [job for job in self._jobs if job.owner == owner]
+        for job in jobs:
+            job.cancel()
+
+    def shutdown(self):
+        """Cancel every unfinished job and stop the workers once their current job returns."""
+        with self._condition:
+            self._stopped = True
+            jobs = list(self._jobs)
+            self._condition.notify_all()
+        for job in jobs:
+            job.cancel()
+
+        with self._process_pool_lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False, cancel_futures=True)
+                self._process_pool = None
+
+    def get_jobs(self, owner: str | None = None) -> List[Job]:
+        """Unfinished jobs."""
+        with self._condition:
+            return [job for job in self._jobs if owner is None or job.owner == owner]
+
+    def describe(self) -> str:
+        with self._condition:
+            running = sum(1 for job in self._jobs if job.state == JobState.RUNNING)
+            return f"{running}/{self.workers} workers busy · {len(self._queue)} queued"
+
+    def _next_job(self) -> Job | None:
+        """Block until a job can run. `None` once the manager is shut down."""
+        with self._condition:
+            while True:
+                # Cancelled jobs are dropped without running
+                while self._queue and self._queue[0][2].cancelled:
+                    _, _, job = heapq.heappop(self._queue)
+                    self._finish(job, JobState.CANCELLED)
+
+                if self._stopped:
+                    return None
+                if self._queue:
+                    job = self._queue[0][2]
+                    if job.priority == JobPriority.INTERACTIVE or self._running_background < self._background_limit:
+                        heapq.heappop(self._queue)
+                        job.state = JobState.RUNNING
+                        if job.priority == JobPriority.BACKGROUND:
+                            self._running_background += 1
+                        return job
+                self._condition.wait()
+
+    def _work(self):
+        while (job := self._next_job()) is not None:
+            try:
+                result = self._run_in_process(job) if job.in_process else job.function(job, *job.args, **job.kwargs)
+            except CancelledError:
+                state = JobState.CANCELLED
+            except Exception as e:
+                state = JobState.FAILED
+                if not job.cancelled:
+                    if job.on_error is None:
+                        logger.warning(f"[JobManager] Job `{job.function.__name__}` of `{job.owner}` failed: {e}")
+                    self._deliver(job, "error", e)
+            else:
+                state = JobState.DONE
+                if not job.cancelled:
+                    self._deliver(job, "done", result)
+
+            with self._condition:
+                if job.priority == JobPriority.BACKGROUND:
+                    self._running_background -= 1
+                self._finish(job, JobState.CANCELLED if job.cancelled else state)
+                # A background job may have been waiting for this worker
+                self._condition.notify()
+
+    def _run_in_process(self, job: Job) -> Any:
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                # Forking the shell would copy its GTK state and threads into the workers
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.process_workers, mp_context=multiprocessing.get_context("forkserver")
+                )
+        future = self._process_pool.submit(job.function, *job.args, **job.kwargs)
+        # Only stops it if it hasn't started in the pool yet
+        job.token.add_callback(future.cancel)
+        return future.result()
+
+    def _finish(self, job: Job, state: JobState):
+        # Called with the condition held
+        job.state = state
+        if job in self._jobs:
+            self._jobs.remove(job)
+
+    def _deliver(self, job: Job, kind: str, value: Any):
+        with self._delivery_lock:
+            deliveries = self._deliveries.setdefault(job, [])
+            # Progress reports overwrite each other, only the latest one matters
+            if kind == "progress" and deliveries and deliveries[-1][0] == "progress":
+                deliveries[-1] = (kind, value)
+            else:
+                deliveries.append((kind, value))
+
+            if not self._flush_handler:
+                self._flush_handler = GLib.idle_add(self._flush)
+
+    def _flush(self) -> bool:
+        with self._delivery_lock:
+            deliveries, self._deliveries = self._deliveries, {}
+            self._flush_handler = 0
+
+        for job, items in deliveries.items():
+            for kind, value in items:
+                # Cancelled while the delivery was waiting for the main loop
+                if job.cancelled:
+                    break
+                callback = {"progress": job.on_progress, "done": job.on_done, "error": job.on_error}[kind]
+                if callback is None:
+                    continue
+                try:
+                    callback(*value) if kind == "progress" else callback(value)
+                except Exception as e:
+                    logger.warning(f"[JobManager] Error in {kind} callback of `{job.owner}`: {e}")
+        return False
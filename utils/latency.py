@@ -0,0 +1,36 @@
+import math
+from collections import deque
+from typing import Dict, Iterable
+
+
+class LatencyRecorder:
+    """Keep the last `capacity` latency samples (in milliseconds) and summarize them as percentiles."""
+
+    def __init__(self, name: str, capacity: int = 512):
+        self.name = name
+        self._samples = deque(maxlen=capacity)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, milliseconds: float):
+        self._samples.append(milliseconds)
+
+    def percentiles(self, percents: Iterable[float] = (50, 95, 99)) -> Dict[float, float]:
+        """Nearest-rank percentiles of the recorded samples."""
+        samples = sorted(self._samples)
+        if not samples:
+            return {percent: 0.0 for percent in percents}
+        return {
+            percent: samples[max(math.ceil(percent / 100 * len(samples)) - 1, 0)]
+            for percent in percents
+        }
+
+    def describe(self) -> str:
+        if not self._samples:
+            return "No samples yet"
+        p = self.percentiles()
+        return f"p50 {p[50]:.1f} ms · p95 {p[95]:.1f} ms · p99 {p[99]:.1f} ms ({len(self)} samples)"
+
+    def clear(self):
+        self._samples.clear()
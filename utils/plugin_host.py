@@ -0,0 +1,449 @@
+"""
+Out of process plugin host.
+
+Launcher plugins whose manifest sets `"out_of_process": true` run in a separate Python process, so a slow or
+crashing plugin can't stall or take down the shell. Their manifest also maps each command to its
+`LauncherCommandType` name in `"command_types"`, since the plugin is only loaded in the host when its first command
+runs. The shell and the host talk over a Unix socket pair with length prefixed JSON frames:
+
+    shell -> host   {"type": "load", "plugin": name, "dir": dir name, "path": plugin.py}
+                    {"type": "unload", "plugin": name}
+                    {"type": "run", "id": n, "plugin": name, "command": command, "prompt": prompt}
+                    {"type": "cancel", "id": n}
+                    {"type": "action", "action": action id}
+    host -> shell   {"type": "loaded", "plugin": name, "commands": {command: LauncherCommandType name}}
+                    {"type": "batch", "id": n, "entries": [entry, ...]}
+                    {"type": "done", "id": n}
+                    {"type": "error", "id": n | None, "message": message}
+
+Run with `python -m utils.plugin_host <socket fd>`. Only launcher commands returning entries can run out of process,
+there is no GTK main loop and no `ShellContext` in the host. Plugins running there should import the base classes
+from `utils.plugin_types`, which doesn't pull in GTK.
+"""
+import itertools, json, os, queue, socket, struct, subprocess, sys, threading, time
+from gi.repository import GLib
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from typing import Any, Callable, Dict, List, Set
+
+# Big endian payload length
+FRAME_HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# Restart delay after a crash, doubled on every crash in a row
+HOST_RESTART_DELAY = 500
+HOST_MAX_RESTART_DELAY = 30000
+# A host that ran this long is considered healthy again
+HOST_STABLE_TIME = 10
+
+HOST_WORKERS = 4
+# Entry actions remembered by the host, older ones can't be activated anymore
+HOST_MAX_ACTIONS = 512
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_frame(sock: socket.socket, message: Dict[str, Any]):
+    payload = json.dumps(message, separators=(",", ":")).encode()
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def read_frame(sock: socket.socket) -> Dict[str, Any] | None:
+    """Read the next message. Return `None` once the other side is gone."""
+    if (header := _read_exactly(sock, FRAME_HEADER.size)) is None:
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"frame of {size} bytes is too big")
+    if (payload := _read_exactly(sock, size)) is None:
+        return None
+    return json.loads(payload)
+
+
+def _read_exactly(sock: socket.socket, size: int) -> bytes | None:
+    data = bytearray()
+    while len(data) < size:
+        if not (chunk := sock.recv(size - len(data))):
+            return None
+        data += chunk
+    return bytes(data)
+
+
+class RemoteStream(Iterator):
+    """Result batches of a command running in the host. Blocks until the next batch arrives."""
+
+    def __init__(self, host: "PluginHost", request_id: int, decode: Callable[[List[Dict[str, Any]]], Any]):
+        self._host = host
+        self._request_id = request_id
+        self._decode = decode
+        self._queue: queue.Queue = queue.Queue()
+
+    def __next__(self):
+        kind, payload = self._queue.get()
+        if kind == "batch":
+            return self._decode(payload)
+        if kind == "error":
+            raise RuntimeError(payload)
+        raise StopIteration
+
+    def cancel(self):
+        self._host.cancel(self._request_id)
+        self._queue.put(("done", None))
+
+    def push(self, kind: str, payload: Any = None):
+        self._queue.put((kind, payload))
+
+
+class PluginHost:
+    """
+    Shell side of the plugin host. Starts the host process when the first command runs and restarts it when it dies.
+    Plugins are only remembered until then, they are loaded in the host right after it starts.
+    """
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._process: subprocess.Popen | None = None
+        self._socket: socket.socket | None = None
+        self._started_at = 0.0
+        self._restart_delay = HOST_RESTART_DELAY
+        self._restart_handler = 0
+
+        # Loaded again after a restart
+        self._plugins: Dict[str, Dict[str, Any]] = {}
+        self._on_loaded: Dict[str, Callable[[Dict[str, str]], None]] = {}
+
+        self._request_ids = itertools.count(1)
+        self._streams: Dict[int, RemoteStream] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # Commands can start the host from any thread
+        self._start_lock = threading.Lock()
+
+    def load_plugin(self, plugin_name: str, dir_name: str, plugin_entry: str, on_loaded: Callable[[Dict[str, str]], None]):
+        """
+        Load a plugin in the host, once it runs. `on_loaded` is called on the main thread with its commands' types.
+        Doesn't start the host, importing the plugin is deferred to its first command.
+        """
+        message = {"type": "load", "plugin": plugin_name, "dir": dir_name, "path": plugin_entry}
+        self._plugins[plugin_name] = message
+        self._on_loaded[plugin_name] = on_loaded
+
+        if self._process is not None:
+            self._send_quietly(message)
+
+    def unload_plugin(self, plugin_name: str):
+        self._on_loaded.pop(plugin_name, None)
+        if self._plugins.pop(plugin_name, None) is not None:
+            self._send_quietly({"type": "unload", "plugin": plugin_name})
+
+    def run(self, plugin_name: str, command: str, prompt: str, decode: Callable[[List[Dict[str, Any]]], Any]) -> RemoteStream:
+        """Run a command in the host. Safe to call from any thread."""
+        request_id = next(self._request_ids)
+        stream = RemoteStream(self, request_id, decode)
+        with self._lock:
+            self._streams[request_id] = stream
+
+        with self._start_lock:
+            # Not started yet. While a restart is pending the command fails like it would with a dead host.
+            if self._process is None and not self._restart_handler:
+                self._spawn()
+
+        try:
+            self._send({"type": "run", "id": request_id, "plugin": plugin_name, "command": command, "prompt": prompt})
+        except ConnectionError:
+            with self._lock:
+                self._streams.pop(request_id, None)
+            stream.push("error", "The plugin host is not running")
+        return stream
+
+    def cancel(self, request_id: int):
+        with self._lock:
+            if self._streams.pop(request_id, None) is None:
+                return
+        self._send_quietly({"type": "cancel", "id": request_id})
+
+    def run_action(self, action_id: int):
+        self._send_quietly({"type": "action", "action": action_id})
+
+    def stop(self):
+        self._plugins.clear()
+        if self._restart_handler:
+            GLib.source_remove(self._restart_handler)
+            self._restart_handler = 0
+        if self._process is not None:
+            process, self._process = self._process, None
+            process.terminate()
+        self._close_socket()
+
+    def _start(self):
+        with self._start_lock:
+            self._restart_handler = 0
+            if self._process is None:
+                self._spawn()
+        return False
+
+    def _spawn(self):
+        shell_socket, host_socket = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            process = subprocess.Popen(
+                [sys.executable, "-m", "utils.plugin_host", str(host_socket.fileno())],
+                cwd=ROOT_PATH,
+                pass_fds=(host_socket.fileno(),),
+            )
+        except OSError as e:
+            logger.error(f"[PluginHost] Could not start the plugin host: {e}")
+            shell_socket.close()
+            return
+        finally:
+            host_socket.close()
+
+        self._process = process
+        self._socket = shell_socket
+        self._started_at = time.monotonic()
+        threading.Thread(
+            target=self._read_replies, args=(shell_socket, process), name="plugin-host-reader", daemon=True
+        ).start()
+        logger.debug(f"[PluginHost] Started plugin host (pid {process.pid}).")
+
+        for message in list(self._plugins.values()):
+            self._send_quietly(message)
+
+    def _send(self, message: Dict[str, Any]):
+        with self._write_lock:
+            if self._socket is None:
+                raise ConnectionError("plugin host is not running")
+            try:
+                write_frame(self._socket, message)
+            except OSError as e:
+                raise ConnectionError(e) from e
+
+    def _send_quietly(self, message: Dict[str, Any]):
+        # The reader notices when the host dies and restarts it, which loads the plugins again
+        try:
+            self._send(message)
+        except ConnectionError:
+            pass
+
+    def _close_socket(self):
+        with self._write_lock:
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+
+    def _read_replies(self, sock: socket.socket, process: subprocess.Popen):
+        try:
+            while (message := read_frame(sock)) is not None:
+                self._dispatch(message)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[PluginHost] Lost connection to the plugin host: {e}")
+
+        process.wait()
+        GLib.idle_add(self._on_host_exited, process)
+
+    def _dispatch(self, message: Dict[str, Any]):
+        """Route a reply. Runs on the reader thread."""
+        kind = message.get("type")
+        if kind == "loaded":
+            GLib.idle_add(self._deliver_loaded, message["plugin"], message["commands"])
+            return
+
+        with self._lock:
+            stream = self._streams.get(message.get("id"))
+            if kind in ("done", "error"):
+                self._streams.pop(message.get("id"), None)
+
+        if kind == "batch" and stream is not None:
+            stream.push("batch", message["entries"])
+        elif kind == "done" and stream is not None:
+            stream.push("done")
+        elif kind == "error":
+            if stream is not None:
+                stream.push("error", message["message"])
+            else:
+                logger.warning(f"[PluginHost] {message['message']}")
+
+    def _deliver_loaded(self, plugin_name: str, commands: Dict[str, str]):
+        if (on_loaded := self._on_loaded.get(plugin_name)) is not None:
+            on_loaded(commands)
+        return False
+
+    def _on_host_exited(self, process: subprocess.Popen):
+        if process is not self._process:
+            # Stopped on purpose
+            return False
+
+        self._process = None
+        self._close_socket()
+        with self._lock:
+            streams, self._streams = self._streams, {}
+        for stream in streams.values():
+            stream.push("error", "The plugin host exited")
+
+        if time.monotonic() - self._started_at > HOST_STABLE_TIME:
+            self._restart_delay = HOST_RESTART_DELAY
+        logger.warning(
+            f"[PluginHost] Plugin host exited with code {process.returncode}, restarting in {self._restart_delay}ms."
+        )
+        self._restart_handler = GLib.timeout_add(self._restart_delay, self._start)
+        self._restart_delay = min(self._restart_delay * 2, HOST_MAX_RESTART_DELAY)
+        return False
+
+
+class _HostServer:
+    """Host side. Serves the requests of a single shell until it goes away."""
+
+    def __init__(self, sock: socket.socket):
+        # Only the host process needs the plugin classes
+        from utils.plugin_types import LauncherCommandType, LauncherPlugin, Plugin, ToolbarPlugin
+
+        self._command_types = LauncherCommandType
+        self._launcher_plugin = LauncherPlugin
+        self._base_classes = (Plugin, ToolbarPlugin, LauncherPlugin)
+
+        self._socket = sock
+        self._write_lock = threading.Lock()
+        self._plugins: Dict[str, Any] = {}
+        self._plugin_dirs: Dict[str, str] = {}
+        self._executor = ThreadPoolExecutor(max_workers=HOST_WORKERS, thread_name_prefix="plugin-host")
+        self._cancelled: Set[int] = set()
+        self._action_ids = itertools.count(1)
+        self._actions: OrderedDict[int, Any] = OrderedDict()
+        self._actions_lock = threading.Lock()
+
+    def serve(self):
+        while (message := read_frame(self._socket)) is not None:
+            handler = getattr(self, f"_on_{message.get('type')}", None)
+            if handler is None:
+                self._send({"type": "error", "id": message.get("id"), "message": f"Unknown request `{message.get('type')}`"})
+                continue
+            try:
+                handler(message)
+            except Exception as e:
+                self._send({"type": "error", "id": message.get("id"), "message": f"{type(e).__name__}: {e}"})
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _send(self, message: Dict[str, Any]):
+        with self._write_lock:
+            write_frame(self._socket, message)
+
+    def _on_load(self, message: Dict[str, Any]):
+        import importlib.util
+
+        plugin_name, dir_name = message["plugin"], message["dir"]
+        self._forget_modules(dir_name)
+        spec = importlib.util.spec_from_file_location(f"plugins.{dir_name}.plugin", message["path"])
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        for attr_name in dir(module):
+            attr = getattr(module, attr_name)
+            if (
+                isinstance(attr, type)
+                and issubclass(attr, self._launcher_plugin)
+                and attr not in self._base_classes
+            ):
+                plugin = attr()
+                if plugin.plugin_name() != plugin_name:
+                    continue
+                plugin.initialize(None)
+                self._plugins[plugin_name] = plugin
+                self._plugin_dirs[plugin_name] = dir_name
+
+                commands = {}
+                for command in plugin.register_commands():
+                    if (command_data := plugin.run_command(command)) is not None:
+                        commands[command] = command_data[0].name
+                self._send({"type": "loaded", "plugin": plugin_name, "commands": commands})
+                logger.debug(f"[PluginHost] Loaded plugin `{plugin_name}`.")
+                return
+
+        raise LookupError(f"no launcher plugin named `{plugin_name}` in `{message['path']}`")
+
+    def _on_unload(self, message: Dict[str, Any]):
+        if (plugin := self._plugins.pop(message["plugin"], None)) is not None:
+            plugin.shutdown()
+        if (dir_name := self._plugin_dirs.pop(message["plugin"], None)) is not None:
+            self._forget_modules(dir_name)
+
+    def _forget_modules(self, dir_name: str):
+        package = f"plugins.{dir_name}"
+        for module_name in [name for name in sys.modules if name == package or name.startswith(f"{package}.")]:
+            del sys.modules[module_name]
+
+    def _on_run(self, message: Dict[str, Any]):
+        self._executor.submit(self._run, message)
+
+    def _on_cancel(self, message: Dict[str, Any]):
+        self._cancelled.add(message["id"])
+
+    def _on_action(self, message: Dict[str, Any]):
+        with self._actions_lock:
+            action = self._actions.get(message["action"])
+        if action is not None:
+            action.action(*(action.data or ()))
+
+    def _run(self, message: Dict[str, Any]):
+        request_id = message["id"]
+        try:
+            plugin = self._plugins[message["plugin"]]
+            if (command_data := plugin.run_command(message["command"])) is None:
+                self._send({"type": "done", "id": request_id})
+                return
+
+            command_type, command_factory = command_data
+            if command_type in (self._command_types.WIDGET, self._command_types.WIDGET_WITH_CONFIRMATION):
+                raise TypeError("widget commands can't run out of process")
+            single_entry = command_type in (
+                self._command_types.SINGLE_ENTRY, self._command_types.SINGLE_ENTRY_WITH_CONFIRMATION
+            )
+
+            result = command_factory(message["prompt"])
+            for batch in result if isinstance(result, Iterator) else [result]:
+                if request_id in self._cancelled:
+                    break
+                entries = ([batch] if batch is not None else []) if single_entry else list(batch or [])
+                self._send({"type": "batch", "id": request_id, "entries": [self._encode_entry(entry) for entry in entries]})
+            self._send({"type": "done", "id": request_id})
+        except Exception as e:
+            self._send({"type": "error", "id": request_id, "message": f"{type(e).__name__}: {e}"})
+        finally:
+            self._cancelled.discard(request_id)
+
+    def _encode_entry(self, entry) -> Dict[str, Any]:
+        actions = []
+        for action in entry.actions or []:
+            with self._actions_lock:
+                action_id = next(self._action_ids)
+                self._actions[action_id] = action
+                while len(self._actions) > HOST_MAX_ACTIONS:
+                    self._actions.popitem(last=False)
+            actions.append({"name": action.name, "keys": action.keys, "id": action_id})
+
+        return {
+            "icon": entry.icon,
+            "title": entry.title,
+            "description": entry.description,
+            "markup": entry.description_is_markup,
+            "label": entry.label,
+            "actions": actions,
+        }
+
+
+def main():
+    sock = socket.socket(fileno=int(sys.argv[1]))
+    # Plugins import the shell's modules
+    sys.path.insert(0, ROOT_PATH)
+    _HostServer(sock).serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Plugin base classes and the data they hand to the launcher.
+
+Kept free of GTK and the shell's modules so the plugin host process can import them cheaply,
+`utils.plugins` re-exports everything here.
+"""
+import abc
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    from gi.repository import Gtk
+    from utils.plugins import ShellContext
+
+class Plugin(abc.ABC):
+    """Base class for all plugins"""
+
+    @abc.abstractmethod
+    def plugin_name(self) -> str: ...
+
+    @abc.abstractmethod
+    def plugin_description(self) -> str: ...
+
+    @abc.abstractmethod
+    def initialize(self, shell_context: "ShellContext") -> None: ...
+
+    def shutdown(self) -> None:
+        """Called before the plugin is unloaded or reloaded. Handlers added through its context are released already."""
+
+    # TODO: Make these part of ShellContext
+    # ShellContext.NotificationManager.notify(notification: Widget)
+    # ShellContext.Calendar.add_event(event: Event)
+
+class ToolbarPlugin(Plugin):
+    """
+        Interface for toolbar plugins.
+        Toolbar plugins can add interactive Gtk.Widgets to the toolbar (i.e., status bar far right)
+    """
+
+    # State shared by this plugin's widgets on every status bar, see `create_toolbar_model`
+    toolbar_model: Any = None
+
+    def create_toolbar_model(self) -> Any:
+        """
+            Create the state shared by the widgets of every status bar, e.g. a `CommonButtonModel`.
+            Called once after `initialize`, the result is stored in `toolbar_model`.
+            `register_toolbar_widget` is called once per status bar and should only build a view bound to it.
+        """
+        return None
+
+    @abc.abstractmethod
+    def register_toolbar_widget(self) -> "Gtk.Widget": ...
+
+class LauncherAction:
+    def __init__(self, name: str, keys: str, action: Callable, data: Tuple[Any, ...] | None = None):
+        self.name = name
+        self.keys = keys
+        self.action = action
+        self.data = data
+
+class LauncherCommandType(Enum):
+    SINGLE_ENTRY = 0
+    SINGLE_ENTRY_WITH_CONFIRMATION = 1
+    LIST = 2
+    LIST_WITH_CONFIRMATION = 3
+    WIDGET = 4
+    WIDGET_WITH_CONFIRMATION = 5
+
+class LauncherEntry:
+    def __init__(
+        self,
+        icon: str,
+        title: str,
+        description_label: str | None = None,
+        description_markup: str | None = None,
+        label: str | None = None,
+        actions: List[LauncherAction] | None = None
+    ):
+        if description_label is None and description_markup is None:
+            raise TypeError("LauncherEntries must provide either `description_label` or `description_markup`.")
+
+        self.icon = icon
+        self.title = title
+        self.description = description_markup if description_markup else description_label
+        # Whether `description` is Pango markup or plain text
+        self.description_is_markup = bool(description_markup)
+        self.label = label
+        self.actions = actions
+
+class LauncherPlugin(Plugin):
+    """
+        Interface for launcher plugins.
+        Launcher plugins can register commands and add widgets and actions to them.
+    """
+
+    @abc.abstractmethod
+    def register_commands(self) -> List[str]: ...
+
+    @abc.abstractmethod
+    def run_command(self, command: str) -> Tuple[LauncherCommandType, Callable] | None: ...
+
+    def tag_parser(self, prompt: str) -> Dict[str, str] | None:
+        # TODO:
+        ...
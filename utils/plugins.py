@@ -1,28 +1,93 @@
-import abc, gi, os, sys, importlib.util
+import gc, gi, json, os, sys, time, weakref, importlib.util
 gi.require_versions({"Gtk": "3.0"})
-from gi.repository import Gtk
+from gi.repository import Gio, GLib, Gtk
 from loguru import logger
-from config import MAIN_MONITOR_ID, toolbar_plugin_order
+from config import (
+    MAIN_MONITOR_ID,
+    PLUGIN_BUDGET_AUTO_DISABLE,
+    PLUGIN_BUDGET_STRIKES,
+    PLUGIN_BUDGET_WINDOW,
+    PLUGIN_FRAME_BUDGET_MS,
+    PLUGIN_OUT_OF_PROCESS,
+    PLUGIN_PROFILE_MEMORY,
+    toolbar_plugin_order,
+)
 from fabric.utils import get_relative_path
-from typing import Any, List, Dict, Callable, Tuple
-from enum import Enum
+from typing import Any, List, Dict, Callable, Set, Tuple
+from types import ModuleType
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from modules.status_bar import StatusBar
+from widgets.common_button import CommonButton
+from utils.trie import PrefixTrie
+from utils.profiling import PhaseStats, Profiler
+from utils.plugin_host import PluginHost
+from utils.budget import MainLoopBudget
+from utils.icons import IconIndex, get_icon_dirs
+from utils.services import SHELL_CONSUMER, ServiceRegistry, get_job_manager
+from utils.jobs import Job, JobManager, JobPriority
+from utils.plugin_types import (
+    LauncherAction,
+    LauncherCommandType,
+    LauncherEntry,
+    LauncherPlugin,
+    Plugin,
+    ToolbarPlugin,
+)
 
 class ShellContext:
     """Provides plugins access to shell's components."""
 
-    def __init__(self, status_bars, launcher):
+    def __init__(self, status_bars, launcher, plugin_manager):
         self._status_bars = status_bars
         self._main_status_bar: StatusBar = self._get_main_status_bar()
         self.launcher = launcher
         self.main_toolbar = self._main_status_bar.toolbar
+        self.plugin_manager = plugin_manager
+        self.services = ServiceRegistry.get_instance()
 
     def get_launcher(self):
         return self.launcher
 
+    def get_plugin_manager(self):
+        return self.plugin_manager
+
+    def get_services(self) -> ServiceRegistry:
+        return self.services
+
+    def register_service(self, name: str, factory: Callable[[], Any], teardown: Callable[[Any], None] | None = None):
+        self.services.register(name, factory, teardown)
+
+    def acquire_service(self, name: str) -> Any:
+        return self.services.acquire(name, SHELL_CONSUMER)
+
+    def release_service(self, name: str):
+        self.services.release(name, SHELL_CONSUMER)
+
+    @property
+    def job_manager(self) -> JobManager:
+        # Its workers only start once something needs them
+        return get_job_manager()
+
+    def get_job_manager(self) -> JobManager:
+        return self.job_manager
+
+    def create_job(self, function: Callable, *args, priority: JobPriority = JobPriority.BACKGROUND, **kwargs) -> Job:
+        """Run `function(job, *args, **kwargs)` off the main loop, see `JobManager.create_job`."""
+        return self.job_manager.create_job(function, *args, owner=SHELL_CONSUMER, priority=priority, **kwargs)
+
     def get_toolbar(self):
         return self.main_toolbar
 
+    def get_toolbars(self):
+        return [bar.toolbar for bar in self._status_bars]
+
+    def reload_plugins(self):
+        self.plugin_manager.reload_plugins()
+
+    def reload_plugin(self, plugin_name: str) -> bool:
+        return self.plugin_manager.reload_plugin(plugin_name)
+
     def _get_main_status_bar(self) -> StatusBar:
         for bar in self._status_bars:
             if bar.get_monitor() == MAIN_MONITOR_ID:
@@ -30,81 +95,241 @@ class ShellContext:
 
         return self._status_bars[0]
 
-class Plugin(abc.ABC):
-    """Base class for all plugins"""
+class PluginContext:
+    """
+        `ShellContext` handed to a single plugin.
+        Signal handlers, main loop sources, jobs and services acquired through it are released when the plugin is unloaded,
+        so a reloaded plugin leaves no callbacks into its old instance behind. Callbacks are also timed against
+        the plugin's main loop budget.
+    """
+
+    def __init__(self, shell_context: ShellContext, plugin_name: str, budget: MainLoopBudget):
+        self._shell_context = shell_context
+        self.plugin_name = plugin_name
+        self._budget = budget
+        self._handlers: List[Tuple[Any, int]] = []
+        self._sources: Set[int] = set()
 
-    @abc.abstractmethod
-    def plugin_name(self) -> str: ...
+    def __getattr__(self, name):
+        return getattr(self._shell_context, name)
 
-    @abc.abstractmethod
-    def plugin_description(self) -> str: ...
+    def connect(self, obj, signal_name: str, callback: Callable, *args) -> int:
+        handler_id = obj.connect(signal_name, self._budget.wrap(self.plugin_name, "signal", callback), *args)
+        self._handlers.append((obj, handler_id))
+        return handler_id
 
-    @abc.abstractmethod
-    def initialize(self, shell_context: ShellContext) -> None: ...
+    def disconnect(self, obj, handler_id: int):
+        self._handlers.remove((obj, handler_id))
+        obj.disconnect(handler_id)
 
-    # TODO: Make these part of ShellContext
-    # ShellContext.NotificationManager.notify(notification: Widget)
-    # ShellContext.Calendar.add_event(event: Event)
-    # ShellContext.JobManager.create_job(job: Job)
+    def timeout_add(self, interval: int, callback: Callable, *args) -> int:
+        return self._add_source(lambda dispatch: GLib.timeout_add(interval, dispatch), "timeout", callback, args)
 
-class ToolbarPlugin(Plugin):
+    def idle_add(self, callback: Callable, *args) -> int:
+        return self._add_source(GLib.idle_add, "idle", callback, args)
+
+    def source_remove(self, source_id: int):
+        if source_id in self._sources:
+            self._sources.discard(source_id)
+            GLib.source_remove(source_id)
+
+    def acquire_service(self, name: str) -> Any:
+        return self._shell_context.services.acquire(name, self.plugin_name)
+
+    def release_service(self, name: str):
+        self._shell_context.services.release(name, self.plugin_name)
+
+    def create_job(
+        self,
+        function: Callable,
+        *args,
+        priority: JobPriority = JobPriority.BACKGROUND,
+        on_done: Callable[[Any], None] | None = None,
+        on_error: Callable[[Exception], None] | None = None,
+        on_progress: Callable[[float, str | None], None] | None = None,
+        **kwargs,
+    ) -> Job:
+        # The job itself runs off the main loop, only its callbacks count towards the budget
+        wrap = lambda callback: callback and self._budget.wrap(self.plugin_name, "job", callback)
+        return self.acquire_service("jobs").create_job(
+            function,
+            *args,
+            owner=self.plugin_name,
+            priority=priority,
+            on_done=wrap(on_done),
+            on_error=wrap(on_error),
+            on_progress=wrap(on_progress),
+            **kwargs,
+        )
+
+    def release(self):
+        for obj, handler_id in self._handlers:
+            if obj.handler_is_connected(handler_id):
+                obj.disconnect(handler_id)
+        self._handlers.clear()
+
+        for source_id in self._sources:
+            GLib.source_remove(source_id)
+        self._sources.clear()
+
+        if (job_manager := self._shell_context.services.get("jobs")) is not None:
+            job_manager.cancel_owner(self.plugin_name)
+
+        # After the handlers, which may be connected to these services
+        self._shell_context.services.release_all(self.plugin_name)
+
+    def _add_source(self, add_source: Callable[[Callable], int], kind: str, callback: Callable, args) -> int:
+        source_id = 0
+        timed_callback = self._budget.wrap(self.plugin_name, kind, callback)
+
+        def dispatch():
+            if timed_callback(*args):
+                return True
+            # Sources are removed by GLib once they return False
+            self._sources.discard(source_id)
+            return False
+
+        source_id = add_source(dispatch)
+        self._sources.add(source_id)
+        return source_id
+
+# Threads used to import plugin modules at startup
+PLUGIN_IMPORT_WORKERS = min(8, os.cpu_count() or 1)
+
+# Changes to these files in a plugin's directory reload it
+PLUGIN_RELOAD_EXTENSIONS = (".py", ".json", ".css")
+
+# Editors write files in several steps, wait for them to settle before reloading
+PLUGIN_RELOAD_DELAY = 250
+
+# Profiled phases of a plugin's life, in order
+PLUGIN_PHASES = ("import", "__init__", "initialize", "register_toolbar_widget", "run_command")
+
+class PluginManifest:
     """
-        Interface for toolbar plugins.
-        Toolbar plugins can add interactive Gtk.Widgets to the toolbar (i.e., status bar far right)
+        Plugin metadata read from `plugins/<name>/manifest.json`.
+        Lets the manager register a plugin's commands and toolbar position without importing it.
     """
 
-    @abc.abstractmethod
-    def register_toolbar_widget(self) -> Gtk.Widget: ...
+    FILE_NAME = "manifest.json"
 
-class LauncherAction:
-    def __init__(self, name: str, keys: str, action: Callable, data: Tuple[Any, ...] | None = None):
-        self.name = name
-        self.keys = keys
-        self.action = action
-        self.data = data
-
-class LauncherCommandType(Enum):
-    SINGLE_ENTRY = 0
-    SINGLE_ENTRY_WITH_CONFIRMATION = 1
-    LIST = 2
-    LIST_WITH_CONFIRMATION = 3
-    WIDGET = 4
-    WIDGET_WITH_CONFIRMATION = 5
-
-class LauncherEntry:
     def __init__(
         self,
-        icon: str,
-        title: str,
-        description_label: str | None = None,
-        description_markup: str | None = None,
-        label: str | None = None,
-        actions: List[LauncherAction] | None = None
+        name: str,
+        path: str,
+        description: str = "",
+        kind: List[str] | None = None,
+        commands: List[str] | None = None,
+        toolbar_order: int | None = None,
+        out_of_process: bool = False,
+        command_types: Dict[str, LauncherCommandType] | None = None,
     ):
-        if description_label is None and description_markup is None:
-            raise TypeError("LauncherEntries must provide either `description_label` or `description_markup`.")
-
-        self.icon = icon
-        self.title = title
-        self.description = description_markup if description_markup else description_label
-        self.label = label
-        self.actions = actions
-
-class LauncherPlugin(Plugin):
+        self.name = name
+        self.path = path
+        self.description = description
+        self.kind = kind or []
+        self.commands = commands or []
+        self.toolbar_order = toolbar_order
+        # The plugin can run in the plugin host process
+        self.out_of_process = out_of_process
+        # What each command returns, required to run it in the host before the plugin is loaded there
+        self.command_types = command_types or {}
+
+    @classmethod
+    def from_dir(cls, plugin_path: str) -> "PluginManifest":
+        with open(os.path.join(plugin_path, cls.FILE_NAME), "r") as manifest_file:
+            data = json.load(manifest_file)
+
+        kind = data.get("kind", [])
+        return cls(
+            name=data["name"],
+            path=plugin_path,
+            description=data.get("description", ""),
+            kind=[kind] if isinstance(kind, str) else list(kind),
+            commands=list(data.get("commands", [])),
+            toolbar_order=data.get("toolbar_order"),
+            out_of_process=bool(data.get("out_of_process", False)),
+            command_types={
+                command: LauncherCommandType[type_name] for command, type_name in data.get("command_types", {}).items()
+            },
+        )
+
+    @property
+    def is_launcher_only(self) -> bool:
+        return self.kind == ["launcher"]
+
+class RemoteLauncherPlugin(LauncherPlugin):
     """
-        Interface for launcher plugins.
-        Launcher plugins can register commands and add widgets and actions to them.
+        Stand-in for a launcher plugin running in the plugin host process.
+        Its commands and their types come from its manifest and their results are streamed back from the host.
     """
 
-    @abc.abstractmethod
-    def register_commands(self) -> List[str]: ...
-
-    @abc.abstractmethod
-    def run_command(self, command: str) -> Tuple[LauncherCommandType, Callable] | None: ...
-
-    def tag_parser(self, prompt: str) -> Dict[str, str] | None:
-        # TODO:
-        ...
+    def __init__(self, manifest: PluginManifest, host: PluginHost):
+        self._manifest = manifest
+        self._host = host
+        # Reported again by the host once the plugin is loaded there
+        self._command_types: Dict[str, LauncherCommandType] = dict(manifest.command_types)
+
+    def plugin_name(self) -> str:
+        return self._manifest.name
+
+    def plugin_description(self) -> str:
+        return self._manifest.description
+
+    def initialize(self, shell_context: ShellContext) -> None:
+        self._host.load_plugin(
+            self._manifest.name,
+            os.path.basename(self._manifest.path),
+            os.path.join(self._manifest.path, "plugin.py"),
+            self._on_loaded,
+        )
+
+    def shutdown(self) -> None:
+        self._host.unload_plugin(self._manifest.name)
+
+    def register_commands(self) -> List[str]:
+        return list(self._manifest.commands)
+
+    def run_command(self, command: str) -> Tuple[LauncherCommandType, Callable] | None:
+        if (command_type := self._command_types.get(command)) is None:
+            return None
+
+        single_entry = command_type in (LauncherCommandType.SINGLE_ENTRY, LauncherCommandType.SINGLE_ENTRY_WITH_CONFIRMATION)
+        return (
+            command_type,
+            lambda prompt: self._host.run(
+                self._manifest.name, command, prompt, lambda entries: self._decode_batch(entries, single_entry)
+            ),
+        )
+
+    def _on_loaded(self, command_types: Dict[str, str]):
+        command_types = {command: LauncherCommandType[type_name] for command, type_name in command_types.items()}
+        for command, command_type in command_types.items():
+            if command in self._manifest.command_types and self._manifest.command_types[command] != command_type:
+                logger.warning(
+                    f"[Shell] Plugin `{self._manifest.name}` declares `{command}` as {self._manifest.command_types[command].name} "
+                    f"in its manifest, but it returns {command_type.name}."
+                )
+        self._command_types = command_types
+
+    def _decode_batch(self, entries: List[Dict[str, Any]], single_entry: bool) -> List[LauncherEntry] | LauncherEntry | None:
+        decoded = [
+            LauncherEntry(
+                icon=entry["icon"],
+                title=entry["title"],
+                description_label=None if entry["markup"] else entry["description"] or "",
+                description_markup=entry["description"] if entry["markup"] else None,
+                label=entry["label"],
+                actions=[
+                    LauncherAction(action["name"], action["keys"], self._host.run_action, (action["id"],))
+                    for action in entry["actions"]
+                ],
+            )
+            for entry in entries
+        ]
+        if single_entry:
+            return decoded[-1] if decoded else None
+        return decoded
 
 class PluginManager:
     """Load and manages plugins"""
@@ -115,6 +340,27 @@ class PluginManager:
         self.toolbar_plugins: Dict[str, ToolbarPlugin] = {}
         self.launcher_plugins: Dict[str, LauncherPlugin] = {}
         self.launcher_commands: Dict[str, str] = {}
+        # Command -> plugin name. Rebuilt when plugins are (re)loaded.
+        self.command_trie: PrefixTrie[str] = PrefixTrie()
+        self.manifests: Dict[str, PluginManifest] = {}
+        # Plugin name -> directory it was loaded from
+        self.plugin_dirs: Dict[str, str] = {}
+        self._shell_context: ShellContext | None = None
+        # Cost of every plugin, per phase of its life
+        self.profiler = Profiler(trace_memory=PLUGIN_PROFILE_MEMORY)
+        # Time plugins spend in callbacks, mostly on the main loop
+        self.budget = MainLoopBudget(
+            PLUGIN_FRAME_BUDGET_MS, PLUGIN_BUDGET_STRIKES, PLUGIN_BUDGET_WINDOW, self._on_budget_exhausted
+        )
+        self.disabled_plugins: Set[str] = set()
+
+        # Released when their plugin is unloaded
+        self._contexts: Dict[str, PluginContext] = {}
+        self._toolbar_widgets: Dict[str, List[Gtk.Widget]] = {}
+
+        self._monitors: Dict[str, Gio.FileMonitor] = {}
+        self._pending_reloads: Set[str] = set()
+        self._reload_handler = 0
 
     def get_plugins(self):
         if not os.path.exists(self.plugins_path):
@@ -123,38 +369,117 @@ class PluginManager:
             )
             return
 
-        for dir_name in os.listdir(self.plugins_path):
-            if dir_name.startswith("_"):
-                continue
-
-            plugin_path = os.path.join(self.plugins_path, dir_name)
+        self.profiler.clear()
+        plugin_entries: List[Tuple[str, str]] = []
 
-            if not os.path.isdir(plugin_path):
-                continue
-
-            plugin_entry = os.path.join(plugin_path, "plugin.py")
-            if not os.path.exists(plugin_entry):
-                continue
-
-            icons_path = os.path.join(plugin_path, "icons")
-            if os.path.exists(icons_path) and os.path.isdir(icons_path):
-                self._append_icons_path(icons_path)
+        for dir_name in os.listdir(self.plugins_path):
+            if (plugin_entry := self._scan_plugin_dir(dir_name)) is not None:
+                plugin_entries.append((plugin_entry, dir_name))
 
+        # Register in directory order, whatever order the imports finish in
+        for dir_name, module in self._import_plugin_modules(plugin_entries):
             try:
-                self._load_plugin_from_file(plugin_entry, dir_name)
+                self._register_plugin_module(module, dir_name)
             except Exception as e:
                 logger.warning(f"[Shell] Error loading plugin `{dir_name}`: {e}")
 
-    def _append_icons_path(self, icons_path):
-        icon_theme = Gtk.IconTheme.get_default()
-        icon_theme.append_search_path(icons_path)
-
-    def _load_plugin_from_file(self, plugin_entry_path: str, plugin_name: str):
-        # Add plugin directory to sys.path temporarily
-        plugin_path = os.path.dirname(plugin_entry_path)
-        sys.path.insert(0, os.path.dirname(plugin_path))
+        self.command_trie.build(self.launcher_commands)
+
+    def _scan_plugin_dir(self, dir_name: str) -> str | None:
+        """Read the manifest of the plugin in `dir_name`. Return its entry point if it has to be imported now."""
+        if dir_name.startswith("_"):
+            return None
+
+        plugin_path = os.path.join(self.plugins_path, dir_name)
+
+        if not os.path.isdir(plugin_path):
+            return None
+
+        plugin_entry = os.path.join(plugin_path, "plugin.py")
+        if not os.path.exists(plugin_entry):
+            return None
+
+        manifest = self._read_manifest(plugin_path)
+        if manifest is not None:
+            self.manifests[manifest.name] = manifest
+            self.plugin_dirs[manifest.name] = dir_name
+
+            if manifest.is_launcher_only and manifest.out_of_process and PLUGIN_OUT_OF_PROCESS:
+                if undeclared := [command for command in manifest.commands if command not in manifest.command_types]:
+                    logger.warning(
+                        f"[Shell] Plugin `{manifest.name}` can't run out of process, its manifest doesn't declare "
+                        f"the type of: {', '.join(undeclared)}"
+                    )
+                else:
+                    self._register_remote_plugin(manifest)
+                    return None
+
+            # Launcher only plugins are imported the first time one of their commands is typed
+            if manifest.is_launcher_only:
+                for command in manifest.commands:
+                    self.launcher_commands[command] = manifest.name
+                return None
+
+        return plugin_entry
+
+    def _register_remote_plugin(self, manifest: PluginManifest):
+        plugin = RemoteLauncherPlugin(manifest, PluginHost.get_instance())
+        self.plugins[manifest.name] = plugin
+        self.launcher_plugins[manifest.name] = plugin
+        for command in plugin.register_commands():
+            self.launcher_commands[command] = manifest.name
+
+    def _import_plugin_modules(self, plugin_entries: List[Tuple[str, str]]) -> List[Tuple[str, ModuleType]]:
+        """Execute the plugin modules on a thread pool. Module level code must not touch GTK."""
+        start = time.perf_counter()
+        modules = []
+        # tracemalloc is process wide, import one at a time so allocations are attributed to the right plugin
+        workers = 1 if self.profiler.trace_memory else PLUGIN_IMPORT_WORKERS
+
+        with self._plugins_importable(), ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="plugin-import"
+        ) as executor:
+            futures = [
+                (dir_name, executor.submit(self._import_plugin_module, plugin_entry, dir_name))
+                for plugin_entry, dir_name in plugin_entries
+            ]
+            for dir_name, future in futures:
+                try:
+                    modules.append((dir_name, future.result()))
+                except Exception as e:
+                    logger.warning(f"[Shell] Error loading plugin `{dir_name}`: {e}")
+
+        logger.debug(f"[Shell] Imported {len(modules)} plugins in {(time.perf_counter() - start) * 1000:.1f}ms.")
+        return modules
+
+    def _read_manifest(self, plugin_path: str) -> PluginManifest | None:
+        if not os.path.exists(os.path.join(plugin_path, PluginManifest.FILE_NAME)):
+            return None
 
         try:
+            return PluginManifest.from_dir(plugin_path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Fall back to loading the plugin eagerly
+            logger.warning(f"[Shell] Invalid manifest for plugin `{os.path.basename(plugin_path)}`: {e}")
+            return None
+
+    @contextmanager
+    def _plugins_importable(self):
+        # Add the plugins' parent directory to sys.path temporarily
+        parent_path = os.path.dirname(self.plugins_path)
+        sys.path.insert(0, parent_path)
+        try:
+            yield
+        finally:
+            sys.path.remove(parent_path)
+
+    def _load_plugin_from_file(self, plugin_entry_path: str, plugin_name: str) -> List[str]:
+        with self._plugins_importable():
+            module = self._import_plugin_module(plugin_entry_path, plugin_name)
+        return self._register_plugin_module(module, plugin_name)
+
+    def _import_plugin_module(self, plugin_entry_path: str, plugin_name: str) -> ModuleType:
+        with self.profiler.measure(plugin_name, "import"):
             spec = importlib.util.spec_from_file_location(
                 f"plugins.{plugin_name}.plugin", plugin_entry_path
             )
@@ -162,76 +487,375 @@ class PluginManager:
             module = importlib.util.module_from_spec(spec)
             spec.loader.exec_module(module)
 
-            for attr_name in dir(module):
-                attr = getattr(module, attr_name)
-                if (
-                    isinstance(attr, type)
-                    and issubclass(attr, Plugin)
-                    and attr not in (Plugin, ToolbarPlugin, LauncherPlugin)
-                ):
+        return module
+
+    def _register_plugin_module(self, module: ModuleType, dir_name: str) -> List[str]:
+        """Instantiate the plugins defined in `module` and return their names."""
+        names = []
+        for attr_name in dir(module):
+            attr = getattr(module, attr_name)
+            if (
+                isinstance(attr, type)
+                and issubclass(attr, Plugin)
+                and attr not in (Plugin, ToolbarPlugin, LauncherPlugin)
+            ):
+                with self.profiler.measure(attr_name, "__init__") as measurement:
                     plugin_instance = attr()
-                    self.plugins[plugin_instance.plugin_name()] = plugin_instance
-
-                    if isinstance(plugin_instance, ToolbarPlugin):
-                        self.toolbar_plugins[plugin_instance.plugin_name()] = plugin_instance
-
-                    if isinstance(plugin_instance, LauncherPlugin):
-                        self.launcher_plugins[plugin_instance.plugin_name()] = plugin_instance
-
-                        for command in plugin_instance.register_commands():
-                            self.launcher_commands[command] = plugin_instance.plugin_name()
-        finally:
-            sys.path.pop(0)
+                    # The plugin's name is only known once it exists
+                    measurement.owner = plugin_instance.plugin_name()
+                self.plugins[plugin_instance.plugin_name()] = plugin_instance
+                self.plugin_dirs[plugin_instance.plugin_name()] = dir_name
+                names.append(plugin_instance.plugin_name())
+
+                if isinstance(plugin_instance, ToolbarPlugin):
+                    self.toolbar_plugins[plugin_instance.plugin_name()] = plugin_instance
+
+                if isinstance(plugin_instance, LauncherPlugin):
+                    self.launcher_plugins[plugin_instance.plugin_name()] = plugin_instance
+
+                    for command in plugin_instance.register_commands():
+                        self.launcher_commands[command] = plugin_instance.plugin_name()
+        return names
+
+    def get_plugin_stats(self) -> List[Tuple[str, float, Dict[str, PhaseStats]]]:
+        """Return `(plugin name, total wall time, stats per phase)` for every profiled plugin, slowest first."""
+        stats = [
+            (name, self.profiler.get_total(name), self.profiler.get_stats(name))
+            for name in self.profiler.get_owners()
+        ]
+        return sorted(stats, key=lambda item: item[1], reverse=True)
+
+    def log_timings(self):
+        """Log how long each plugin took to load, slowest first."""
+        lines = [
+            f"  {name:<20}"
+            + "".join(
+                f" {phase} {phases[phase].wall:.1f}ms" for phase in PLUGIN_PHASES if phase in phases
+            )
+            + f" | total {total:.1f}ms"
+            for name, total, phases in self.get_plugin_stats()
+        ]
+        logger.debug("[Shell] Plugin load times:\n" + "\n".join(lines))
 
     def initialize_plugins(self, shell_context: ShellContext):
+        self._shell_context = shell_context
+
         loaded_plugins = []
-        for name, plugin in self.plugins.items():
-            try:
-                plugin.initialize(shell_context)
+        for name in list(self.plugins):
+            if self._initialize_plugin(name):
                 loaded_plugins.append(name)
-            except Exception as e:
-                logger.warning(f"[Shell] Error initializing plugin `{plugin.plugin_name()}`: {e}")
 
+        deferred_plugins = [name for name in self.manifests if name not in self.plugins]
         logger.debug(f"[Shell] Loaded {len(loaded_plugins)} plugins: ({', '.join(loaded_plugins)})")
+        if deferred_plugins:
+            logger.debug(f"[Shell] Deferred {len(deferred_plugins)} plugins: ({', '.join(deferred_plugins)})")
+
+    def _initialize_plugin(self, plugin_name: str) -> bool:
+        context = PluginContext(self._shell_context, plugin_name, self.budget)
+        self._contexts[plugin_name] = context
+
+        try:
+            with self.profiler.measure(plugin_name, "initialize"):
+                plugin = self.plugins[plugin_name]
+                plugin.initialize(context)
+                if isinstance(plugin, ToolbarPlugin):
+                    plugin.toolbar_model = plugin.create_toolbar_model()
+        except Exception as e:
+            logger.warning(f"[Shell] Error initializing plugin `{plugin_name}`: {e}")
+            return False
+        return True
+
+    def _load_deferred_plugin(self, plugin_name: str) -> LauncherPlugin | None:
+        manifest = self.manifests[plugin_name]
+        start = time.perf_counter()
+
+        try:
+            self._load_plugin_from_file(
+                os.path.join(manifest.path, "plugin.py"), os.path.basename(manifest.path)
+            )
+            if plugin_name not in self.launcher_plugins:
+                raise LookupError(f"no launcher plugin named `{plugin_name}` in `{manifest.path}`")
+        except Exception as e:
+            logger.warning(f"[Shell] Error loading plugin `{plugin_name}`: {e}")
+            self._unload_plugin(plugin_name)
+            # Drop its commands, otherwise we would try again on every keystroke
+            self.command_trie.build(self.launcher_commands)
+            return None
+
+        if not self._initialize_plugin(plugin_name):
+            self._unload_plugin(plugin_name)
+            self.command_trie.build(self.launcher_commands)
+            return None
+
+        # The plugin may register more commands than its manifest declares
+        self.command_trie.build(self.launcher_commands)
+        logger.debug(f"[Shell] Loaded plugin `{plugin_name}` on demand in {(time.perf_counter() - start) * 1000:.1f}ms.")
+        return self.launcher_plugins[plugin_name]
+
+    def _unload_plugin(self, plugin_name: str) -> weakref.ref | None:
+        """Forget a plugin and release everything it registered. Return a weak reference to the old instance."""
+        plugin = self.plugins.pop(plugin_name, None)
+        self.toolbar_plugins.pop(plugin_name, None)
+        self.launcher_plugins.pop(plugin_name, None)
+        for command in [command for command, name in self.launcher_commands.items() if name == plugin_name]:
+            del self.launcher_commands[command]
+
+        if (context := self._contexts.pop(plugin_name, None)) is not None:
+            context.release()
+
+        if plugin is None:
+            return None
+
+        try:
+            plugin.shutdown()
+        except Exception as e:
+            logger.warning(f"[Shell] Error shutting down plugin `{plugin_name}`: {e}")
+        return weakref.ref(plugin)
+
+    def disable_plugin(self, plugin_name: str):
+        """Unload a plugin and remove its toolbar widgets until it's reloaded."""
+        if plugin_name not in self.plugins:
+            return
+
+        for widget in self._toolbar_widgets.pop(plugin_name, []):
+            widget.destroy()
+        self._unload_plugin(plugin_name)
+        self.command_trie.build(self.launcher_commands)
+        self.disabled_plugins.add(plugin_name)
+        logger.warning(f"[Shell] Disabled plugin `{plugin_name}`.")
+
+    def _on_budget_exhausted(self, plugin_name: str):
+        if PLUGIN_BUDGET_AUTO_DISABLE:
+            # Not from inside the plugin's own callback
+            GLib.idle_add(self.disable_plugin, plugin_name)
 
     def neutralize_plugins(self):
         # Remove all plugins
-        self.toolbar_plugins.clear()
-        self.launcher_plugins.clear()
+        for name in list(self.plugins):
+            self._unload_plugin(name)
         self.launcher_commands.clear()
-        for name, plugin in self.plugins:
+        self.command_trie.build({})
+        self.manifests.clear()
+        self.plugin_dirs.clear()
+        self._toolbar_widgets.clear()
+
+    def reload_plugins(self):
+        """Reload every plugin one by one, keeping the toolbar widgets of the others."""
+        dir_names = set(self.plugin_dirs.values()) | set(os.listdir(self.plugins_path))
+        for dir_name in sorted(dir_names):
+            self.reload_plugin_dir(dir_name)
+
+    def reload_plugin(self, plugin_name: str) -> bool:
+        if (dir_name := self.plugin_dirs.get(plugin_name)) is None:
+            logger.warning(f"[Shell] Cannot reload unknown plugin `{plugin_name}`.")
+            return False
+        self.reload_plugin_dir(dir_name)
+        return True
+
+    def reload_plugin_dir(self, dir_name: str):
+        """Reload the plugins in `plugins/<dir_name>`, replacing their toolbar widgets in place."""
+        start = time.perf_counter()
+
+        old_names = [name for name, plugin_dir in self.plugin_dirs.items() if plugin_dir == dir_name]
+        old_widgets = [widget for name in old_names for widget in self._toolbar_widgets.pop(name, [])]
+        old_plugins = []
+        for name in old_names:
+            if (plugin_ref := self._unload_plugin(name)) is not None:
+                old_plugins.append((name, plugin_ref))
+            self.manifests.pop(name, None)
+            self.plugin_dirs.pop(name, None)
+            self.profiler.clear(name)
+            self.budget.clear(name)
+            self.disabled_plugins.discard(name)
+        self._invalidate_modules(dir_name)
+        # The plugin may have added or removed icons
+        IconIndex.get_instance().update(get_icon_dirs(os.path.dirname(self.plugins_path)))
+
+        if (plugin_entry := self._scan_plugin_dir(dir_name)) is not None:
+            try:
+                self._load_plugin_from_file(plugin_entry, dir_name)
+            except Exception as e:
+                logger.warning(f"[Shell] Error loading plugin `{dir_name}`: {e}")
+        # Includes the plugins running in the plugin host
+        new_names = [
+            name for name, plugin_dir in self.plugin_dirs.items()
+            if plugin_dir == dir_name and name in self.plugins and self._initialize_plugin(name)
+        ]
+
+        self.command_trie.build(self.launcher_commands)
+        self._replace_toolbar_widgets(old_widgets, new_names)
+
+        if old_names or new_names:
+            logger.info(f"[Shell] Reloaded plugin `{dir_name}` in {(time.perf_counter() - start) * 1000:.1f}ms.")
+        if old_plugins:
+            # Destroyed widgets are finalized once the main loop gets back to them
+            GLib.idle_add(self._check_collected, old_plugins, priority=GLib.PRIORITY_LOW)
+
+    def _invalidate_modules(self, dir_name: str):
+        # `plugin.py` itself isn't cached, but the modules it imports from its package are
+        package = f"plugins.{dir_name}"
+        for module_name in [name for name in sys.modules if name == package or name.startswith(f"{package}.")]:
+            del sys.modules[module_name]
+        importlib.invalidate_caches()
+
+    def _replace_toolbar_widgets(self, old_widgets: List[Gtk.Widget], new_names: List[str]):
+        # The new widgets take the place of the first old one on each toolbar, or go at the end
+        positions: Dict[Gtk.Container, int] = {}
+        for widget in old_widgets:
+            if (toolbar := widget.get_parent()) is not None:
+                position = toolbar.get_children().index(widget)
+                positions[toolbar] = min(position, positions.get(toolbar, position))
+            widget.destroy()
+
+        if self._shell_context is None:
+            return
+
+        for toolbar in self._shell_context.get_toolbars():
+            position = positions.get(toolbar)
+            for name in new_names:
+                if name not in self.toolbar_plugins:
+                    continue
+                if (widget := self._create_toolbar_widget(name)) is None:
+                    continue
+                toolbar.add_widget(widget)
+                if position is not None:
+                    toolbar.reorder_child(widget, position)
+                    position += 1
+
+    def _check_collected(self, old_plugins: List[Tuple[str, weakref.ref]]):
+        gc.collect()
+        for name, plugin_ref in old_plugins:
+            if (plugin := plugin_ref()) is None:
+                logger.debug(f"[Shell] Old instance of plugin `{name}` was collected.")
+                continue
+
+            referrers = ", ".join(type(referrer).__name__ for referrer in gc.get_referrers(plugin))
+            logger.warning(f"[Shell] Old instance of plugin `{name}` is still alive after reloading. Referrers: {referrers}")
             del plugin
-        self.plugins.clear()
+        return False
+
+    def watch_plugins(self):
+        """Reload a plugin whenever a file in its directory changes."""
+        self._watch_dir(self.plugins_path)
+        for dir_name in os.listdir(self.plugins_path):
+            if os.path.isdir(plugin_path := os.path.join(self.plugins_path, dir_name)):
+                self._watch_dir(plugin_path)
+
+    def _watch_dir(self, path: str):
+        if path in self._monitors:
+            return
+        try:
+            monitor = Gio.File.new_for_path(path).monitor_directory(
+                Gio.FileMonitorFlags.WATCH_MOVES, None
+            )
+        except GLib.Error as e:
+            logger.warning(f"[Shell] Could not watch `{path}`: {e.message}")
+            return
+
+        monitor.connect("changed", self._on_plugin_file_changed)
+        self._monitors[path] = monitor
+
+    def _on_plugin_file_changed(self, _monitor, file: Gio.File, other_file: Gio.File | None, event: Gio.FileMonitorEvent):
+        if event == Gio.FileMonitorEvent.ATTRIBUTE_CHANGED:
+            return
+
+        for changed_file in (file, other_file):
+            if changed_file is None or (path := changed_file.get_path()) is None:
+                continue
+
+            dir_name, _, file_name = os.path.relpath(path, self.plugins_path).partition(os.sep)
+            if dir_name.startswith(("_", ".")):
+                continue
+
+            if not file_name:
+                # A plugin directory was added or removed
+                if event in (Gio.FileMonitorEvent.CREATED, Gio.FileMonitorEvent.MOVED_IN) and os.path.isdir(path):
+                    self._watch_dir(path)
+                elif event in (Gio.FileMonitorEvent.DELETED, Gio.FileMonitorEvent.MOVED_OUT) and path in self._monitors:
+                    self._monitors.pop(path).cancel()
+                else:
+                    continue
+            elif not file_name.endswith(PLUGIN_RELOAD_EXTENSIONS):
+                continue
+
+            self._pending_reloads.add(dir_name)
+
+        if self._pending_reloads and not self._reload_handler:
+            self._reload_handler = GLib.timeout_add(PLUGIN_RELOAD_DELAY, self._flush_reloads)
+
+    def _flush_reloads(self):
+        self._reload_handler = 0
+        for dir_name in sorted(self._pending_reloads):
+            try:
+                self.reload_plugin_dir(dir_name)
+            except Exception as e:
+                logger.warning(f"[Shell] Error reloading plugin `{dir_name}`: {e}")
+        self._pending_reloads.clear()
+        return False
 
     def get_toolbar_widgets(self) -> Dict[str, Gtk.Widget]:
-        # Sort toolbar widgets to follow the order defined in config.py
-        if toolbar_plugin_order and len(toolbar_plugin_order) > 0:
-            complete_order = [
-                key for key in toolbar_plugin_order if key in self.toolbar_plugins
-            ] + list(set(self.toolbar_plugins) - set(toolbar_plugin_order))
-            plugins_in_order = {
-                key: self.toolbar_plugins[key] for key in complete_order
-            }
-        else:
-            plugins_in_order = self.toolbar_plugins
+        # Sort toolbar widgets to follow the order defined in config.py, then the one in their manifests
+        configured_order = [key for key in toolbar_plugin_order or [] if key in self.toolbar_plugins]
+        complete_order = configured_order + sorted(
+            set(self.toolbar_plugins) - set(configured_order),
+            key=lambda key: (self._get_manifest_toolbar_order(key), key),
+        )
 
         widgets = {}
-        for name, plugin in plugins_in_order.items():
-            try:
-                widget = plugin.register_toolbar_widget()
+        for name in complete_order:
+            if (widget := self._create_toolbar_widget(name)) is not None:
                 widgets[name] = widget
-            except Exception as e:
-                logger.warning(
-                    f"[Shell] Failed to register toolbar widget for plugin `{name}`: {e}"
-                )
 
         return widgets
 
-    def look_for_command(self, command: str):
-        ...
+    def _create_toolbar_widget(self, plugin_name: str) -> Gtk.Widget | None:
+        try:
+            with self.profiler.measure(plugin_name, "register_toolbar_widget"):
+                widget = self.toolbar_plugins[plugin_name].register_toolbar_widget()
+        except Exception as e:
+            logger.warning(
+                f"[Shell] Failed to register toolbar widget for plugin `{plugin_name}`: {e}"
+            )
+            return None
+
+        # Button callbacks don't go through the plugin's context, time them here
+        self._wrap_button_callbacks(plugin_name, widget)
+        self._toolbar_widgets.setdefault(plugin_name, []).append(widget)
+        return widget
+
+    def _wrap_button_callbacks(self, plugin_name: str, widget: Gtk.Widget):
+        if isinstance(widget, CommonButton):
+            widget.wrap_callbacks(lambda kind, callback: self.budget.wrap(plugin_name, kind, callback))
+        if isinstance(widget, Gtk.Container):
+            widget.forall(lambda child: self._wrap_button_callbacks(plugin_name, child))
+
+    def _get_manifest_toolbar_order(self, plugin_name: str) -> float:
+        manifest = self.manifests.get(plugin_name)
+        if manifest is None or manifest.toolbar_order is None:
+            return float("inf")
+        return manifest.toolbar_order
+
+    def complete_launcher_command(self, prefix: str) -> List[str]:
+        return [command for command, _ in self.command_trie.complete(prefix)]
 
     def handle_launcher_command(self, command: str) -> Tuple[LauncherCommandType, Callable] | None:
-        if command in self.launcher_commands:
-            plugin_name = self.launcher_commands[command]
-            plugin = self.launcher_plugins[plugin_name]
-            return plugin.run_command(command)
+        if (plugin_name := self.command_trie.get(command)) is None:
+            return None
+
+        if (plugin := self.launcher_plugins.get(plugin_name)) is None:
+            if (plugin := self._load_deferred_plugin(plugin_name)) is None:
+                return None
+
+        with self.profiler.measure(plugin_name, "run_command"), self.budget.measure(plugin_name, "command"):
+            command_data = plugin.run_command(command)
+        if command_data is None:
+            return None
+
+        # Most of a command's work happens in its factory, count it too
+        command_type, factory = command_data
+
+        def profiled_factory(*args, **kwargs):
+            with self.profiler.measure(plugin_name, "run_command"), self.budget.measure(plugin_name, "command"):
+                return factory(*args, **kwargs)
+
+        return command_type, profiled_factory
@@ -0,0 +1,107 @@
+import threading, time, tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class PhaseStats:
+    """Accumulated cost of one phase. Times are in milliseconds, memory in bytes."""
+
+    __slots__ = ("calls", "wall", "cpu", "memory")
+
+    def __init__(self, calls: int = 0, wall: float = 0.0, cpu: float = 0.0, memory: int | None = None):
+        self.calls = calls
+        self.wall = wall
+        self.cpu = cpu
+        # `None` when memory wasn't traced
+        self.memory = memory
+
+    def copy(self) -> "PhaseStats":
+        return PhaseStats(self.calls, self.wall, self.cpu, self.memory)
+
+    def describe(self) -> str:
+        description = f"{self.wall:.1f}ms wall · {self.cpu:.1f}ms cpu"
+        if self.memory is not None:
+            description += f" · {format_size(self.memory)}"
+        if self.calls > 1:
+            description += f" · {self.calls} calls"
+        return description
+
+
+def format_size(size: int) -> str:
+    sign = "-" if size < 0 else "+"
+    size = abs(size)
+    if size < 1024:
+        return f"{sign}{size}B"
+    if size < 1024 * 1024:
+        return f"{sign}{size / 1024:.1f}KiB"
+    return f"{sign}{size / (1024 * 1024):.1f}MiB"
+
+
+class Measurement:
+    """Handle yielded by `Profiler.measure`. `owner` may be changed while measuring."""
+
+    __slots__ = ("owner", "phase")
+
+    def __init__(self, owner: str, phase: str):
+        self.owner = owner
+        self.phase = phase
+
+
+class Profiler:
+    """
+        Accumulates wall time, CPU time and allocated Python memory per owner (e.g. a plugin) and phase.
+        CPU time is the measuring thread's own time. Memory is the change of tracemalloc's traced memory,
+        which is process wide, so phases running concurrently on other threads are counted too.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self._stats: Dict[str, Dict[str, PhaseStats]] = {}
+        self._lock = threading.Lock()
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def measure(self, owner: str, phase: str):
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        memory_start = tracemalloc.get_traced_memory()[0] if tracing else 0
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        measurement = Measurement(owner, phase)
+        try:
+            yield measurement
+        finally:
+            wall = (time.perf_counter() - wall_start) * 1000
+            cpu = (time.thread_time() - cpu_start) * 1000
+            memory = tracemalloc.get_traced_memory()[0] - memory_start if tracing else None
+            self._add(measurement.owner, measurement.phase, wall, cpu, memory)
+
+    def get_stats(self, owner: str) -> Dict[str, PhaseStats]:
+        with self._lock:
+            return {phase: stats.copy() for phase, stats in self._stats.get(owner, {}).items()}
+
+    def get_owners(self) -> List[str]:
+        with self._lock:
+            return list(self._stats)
+
+    def get_total(self, owner: str) -> float:
+        """Total wall time of `owner` in milliseconds."""
+        with self._lock:
+            return sum(stats.wall for stats in self._stats.get(owner, {}).values())
+
+    def clear(self, owner: str | None = None):
+        with self._lock:
+            if owner is None:
+                self._stats.clear()
+            else:
+                self._stats.pop(owner, None)
+
+    def _add(self, owner: str, phase: str, wall: float, cpu: float, memory: int | None):
+        with self._lock:
+            stats = self._stats.setdefault(owner, {}).setdefault(phase, PhaseStats())
+            stats.calls += 1
+            stats.wall += wall
+            stats.cpu += cpu
+            if memory is not None:
+                stats.memory = (stats.memory or 0) + memory
@@ -0,0 +1,326 @@
+import functools, heapq, re, unicodedata
+from typing import Callable, Dict, Generic, Iterable, List, Sequence, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Scores for a single query token. Higher is better; multi-token queries sum their tokens' scores.
+SCORE_EXACT = 1000
+SCORE_PREFIX = 900
+SCORE_WORD_PREFIX = 800
+SCORE_ACRONYM = 650
+SCORE_SUBSTRING = 500
+SCORE_SUBSEQUENCE = 100
+# Matches in the secondary fields (e.g. generic name) rank below the same kind of match in the name
+PENALTY_SECONDARY_FIELD = 100
+
+# Characters that separate words, e.g. `gnome-system-monitor` or `org.gnome.Nautilus`
+WORD_SEPARATORS = " -_./:"
+
+
+def normalize(text: str) -> str:
+    """Casefold and strip accents so that `Écran` matches `ecran`."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def split_words(text: str) -> List[str]:
+    """Split on separators and camelCase boundaries: `LibreOffice Calc` -> [Libre, Office, Calc]"""
+    words = []
+    current = ""
+    for char in text:
+        if char in WORD_SEPARATORS:
+            if current:
+                words.append(current)
+            current = ""
+        elif char.isupper() and current and current[-1].islower():
+            words.append(current)
+            current = char
+        else:
+            current += char
+    if current:
+        words.append(current)
+    return words
+
+
+class _SearchEntry:
+    __slots__ = ("primary", "haystack", "word_starts", "acronym")
+
+    def __init__(self, fields: List[str]):
+        normalized_fields = [normalize(field) for field in fields]
+        self.primary = normalized_fields[0] if normalized_fields else ""
+        # Fields are separated by newlines so that subsequence matches can't span two of them
+        self.haystack = "\n".join(normalized_fields)
+
+        # Offsets in the haystack where a word starts
+        self.word_starts: Set[int] = set()
+        offset = 0
+        for field, normalized_field in zip(fields, normalized_fields):
+            position = 0
+            for word in split_words(field):
+                word = normalize(word)
+                if (found := normalized_field.find(word, position)) < 0:
+                    continue
+                self.word_starts.add(offset + found)
+                position = found + len(word)
+            offset += len(normalized_field) + 1
+
+        self.acronym = "".join(normalize(word[0]) for word in split_words(fields[0])) if fields else ""
+
+
+class SearchIndex(Generic[T]):
+    """
+        Ranked fuzzy search over a fixed list of items.
+        Everything that depends only on the items (normalized haystacks, word boundaries,
+        acronyms and n-gram postings) is computed once when the index is built.
+    """
+
+    def __init__(self, items: Sequence[T], fields: Callable[[T], Iterable[str | None]]):
+        """
+        :param items: Items to search
+        :param fields: Function that returns the searchable texts of an item. The first one is the item's name.
+        """
+        self.items = list(items)
+        self._entries: List[_SearchEntry] = []
+        # Items containing each 1, 2 and 3 character substring
+        self._ngrams: Dict[str, Set[int]] = {}
+        # Character -> item -> score. Single character queries (the first keystroke) are a lookup.
+        self._char_scores: Dict[str, Dict[int, int]] = {}
+
+        for index, item in enumerate(self.items):
+            entry = _SearchEntry([field for field in fields(item) if field])
+            self._entries.append(entry)
+
+            haystack = entry.haystack
+            for length in (1, 2, 3):
+                for i in range(len(haystack) - length + 1):
+                    self._ngrams.setdefault(haystack[i:i + length], set()).add(index)
+
+            # First occurrence of each character, and first one starting a word
+            first_positions: Dict[str, int] = {}
+            word_positions: Dict[str, int] = {}
+            for position, char in enumerate(haystack):
+                first_positions.setdefault(char, position)
+                if position in entry.word_starts:
+                    word_positions.setdefault(char, position)
+            for char, position in first_positions.items():
+                if char != "\n":
+                    self._char_scores.setdefault(char, {})[index] = self._score_occurrence(
+                        entry, char, position, word_positions.get(char)
+                    )
+
+        # Ties are broken by name
+        self._all_ranked = sorted(range(len(self.items)), key=lambda i: self._entries[i].primary)
+        self._order = [0] * len(self.items)
+        for rank, index in enumerate(self._all_ranked):
+            self._order[index] = rank
+
+    def __len__(self):
+        return len(self.items)
+
+    def match(self, query: str, candidates: Iterable[int] | None = None) -> List[Tuple[int, int]]:
+        """
+        Return `(score, index)` pairs for every item matching `query`, unordered.
+
+        :param query: Search query. Whitespace-separated tokens must all match.
+        :param candidates: Restrict the search to these item indexes
+        """
+        tokens = normalize(query).split()
+        if not tokens:
+            return [(0, index) for index in (range(len(self.items)) if candidates is None else candidates)]
+
+        scores: Dict[int, int] | None = None if candidates is None else dict.fromkeys(candidates, 0)
+        for token in tokens:
+            token_scores = self._match_token(token, scores)
+            if scores is not None:
+                for index, score in token_scores.items():
+                    token_scores[index] = score + scores[index]
+            scores = token_scores
+
+        return [(score, index) for index, score in scores.items()]
+
+    def rank(self, matches: Iterable[Tuple[int, int]], limit: int | None = None) -> List[int]:
+        """Order matches by relevance and return the item indexes. If `limit` is set, only the best `limit` are sorted."""
+        order = self._order
+        if limit is None:
+            ranked = sorted(matches, key=lambda match: (-match[0], order[match[1]]))
+        else:
+            ranked = heapq.nsmallest(limit, matches, key=lambda match: (-match[0], order[match[1]]))
+        return [index for _, index in ranked]
+
+    def search(self, query: str, limit: int | None = None) -> List[T]:
+        return self.results(query).page(limit)
+
+    def results(self, query: str) -> "SearchResults[T]":
+        return SearchResults(self, self.match(query) if query.strip() else None)
+
+    def _match_token(self, token: str, candidates: Dict[int, int] | None) -> Dict[int, int]:
+        entries = self._entries
+
+        # A single character is found by the 1-gram postings or not at all, and was scored with the index
+        if len(token) == 1:
+            char_scores = self._char_scores.get(token, {})
+            if candidates is None:
+                return dict(char_scores)
+            return {index: char_scores[index] for index in candidates if index in char_scores}
+
+        scores: Dict[int, int] = {}
+
+        # Substring matches come straight from the n-gram postings
+        substring_hits = self._get_substring_candidates(token)
+        if candidates is not None:
+            substring_hits = substring_hits.intersection(candidates)
+        for index in substring_hits:
+            if (score := self._score_substring(entries[index], token)) is not None:
+                scores[index] = score
+
+        # Everything else can only be an acronym or subsequence match, which needs every character of the token.
+        # Intersecting their 1-gram postings leaves only those items for the regex.
+        pool = self._get_character_candidates(token)
+        if candidates is not None:
+            pool = pool.intersection(candidates)
+        subsequence = _get_subsequence_pattern(token)
+        for index in pool:
+            if index in scores:
+                continue
+            entry = entries[index]
+            if entry.acronym.startswith(token):
+                scores[index] = SCORE_ACRONYM
+            elif match := subsequence.search(entry.haystack):
+                scores[index] = SCORE_SUBSEQUENCE - min(match.end() - match.start() - len(token), 99)
+
+        return scores
+
+    def _get_character_candidates(self, token: str) -> Set[int]:
+        """Items containing every character of `token`."""
+        postings = []
+        for char in set(token):
+            if (posting := self._ngrams.get(char)) is None:
+                return EMPTY_SET
+            postings.append(posting)
+        postings.sort(key=len)
+        return set.intersection(*postings)
+
+    def _get_substring_candidates(self, token: str) -> Set[int]:
+        """Items that may contain `token`. Exact for tokens up to 3 characters."""
+        if len(token) <= 3:
+            return self._ngrams.get(token, EMPTY_SET)
+
+        postings = []
+        for i in range(len(token) - 2):
+            if (posting := self._ngrams.get(token[i:i + 3])) is None:
+                return EMPTY_SET
+            postings.append(posting)
+        postings.sort(key=len)
+        return set.intersection(*postings)
+
+    def _score_substring(self, entry: _SearchEntry, token: str) -> int | None:
+        haystack = entry.haystack
+        if (position := haystack.find(token)) < 0:
+            return None
+
+        if position == 0:
+            if entry.primary == token:
+                return SCORE_EXACT
+            if entry.primary.startswith(token):
+                # Prefer shorter names: `code` should rank `Code` above `Code - OSS`
+                return SCORE_PREFIX - min(len(entry.primary) - len(token), 50)
+
+        first_position = position
+        while position >= 0:
+            if position in entry.word_starts:
+                return SCORE_WORD_PREFIX - self._get_position_penalty(entry, position)
+            position = haystack.find(token, position + 1)
+        return SCORE_SUBSTRING - self._get_position_penalty(entry, first_position)
+
+    def _score_occurrence(self, entry: _SearchEntry, token: str, position: int, word_position: int | None) -> int:
+        """Same as `_score_substring`, given the first position of `token` and the first one starting a word."""
+        if position == 0:
+            if entry.primary == token:
+                return SCORE_EXACT
+            if entry.primary.startswith(token):
+                return SCORE_PREFIX - min(len(entry.primary) - len(token), 50)
+
+        if word_position is not None:
+            return SCORE_WORD_PREFIX - self._get_position_penalty(entry, word_position)
+        return SCORE_SUBSTRING - self._get_position_penalty(entry, position)
+
+    def _get_position_penalty(self, entry: _SearchEntry, position: int) -> int:
+        if position < len(entry.primary):
+            return min(position, 50)
+        return PENALTY_SECONDARY_FIELD + min(position - len(entry.primary), 50)
+
+
+class SearchResults(Generic[T]):
+    """
+        Matches of a query, ranked lazily. Only the requested page is sorted (with a partial sort),
+        so showing the best results costs the same regardless of how many items matched.
+    """
+
+    def __init__(self, index: SearchIndex[T], matches: List[Tuple[int, int]] | None):
+        """
+        :param index: Index the matches come from
+        :param matches: `(score, index)` pairs. `None` means every item, in name order.
+        """
+        self.index = index
+        self.matches = matches
+
+    def __len__(self):
+        return len(self.index) if self.matches is None else len(self.matches)
+
+    def page(self, limit: int | None = None) -> List[T]:
+        """Return the best `limit` items (all of them if `None`), best first."""
+        if self.matches is None:
+            indexes = self.index._all_ranked if limit is None else self.index._all_ranked[:limit]
+        else:
+            indexes = self.index.rank(self.matches, limit)
+        return [self.index.items[index] for index in indexes]
+
+
+class IncrementalSearch(Generic[T]):
+    """
+        Keeps the matches of every query typed so far on a stack.
+        Matching is monotonic (anything matching `firef` also matches `fire`), so when the query
+        extends the previous one only the previous matches are searched. Deleting characters pops
+        back to the cached matches of the shorter query.
+    """
+
+    def __init__(self, index: SearchIndex[T]):
+        self.index = index
+        self._stack: List[Tuple[str, List[Tuple[int, int]]]] = []
+
+    def match(self, query: str) -> List[Tuple[int, int]]:
+        key = normalize(query).lstrip()
+        if not key.strip():
+            self._stack.clear()
+            return self.index.match("")
+
+        while self._stack and not key.startswith(self._stack[-1][0]):
+            self._stack.pop()
+
+        if self._stack and self._stack[-1][0] == key:
+            return self._stack[-1][1]
+
+        candidates = [index for _, index in self._stack[-1][1]] if self._stack else None
+        matches = self.index.match(key, candidates)
+        self._stack.append((key, matches))
+        return matches
+
+    def search(self, query: str, limit: int | None = None) -> List[T]:
+        return self.results(query).page(limit)
+
+    def results(self, query: str) -> SearchResults[T]:
+        if not query.strip():
+            self._stack.clear()
+            return SearchResults(self.index, None)
+        return SearchResults(self.index, self.match(query))
+
+    def reset(self):
+        self._stack.clear()
+
+
+EMPTY_SET: Set[int] = frozenset()
+
+
+@functools.lru_cache(maxsize=64)
+def _get_subsequence_pattern(token: str) -> re.Pattern:
+    return re.compile("[^\\n]*?".join(re.escape(char) for char in token))
@@ -1,10 +1,105 @@
 from fabric.hyprland.service import Hyprland
+from loguru import logger
+from services.hyprland_state import HyprlandState
+from utils.jobs import JobManager
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+# Consumer name of the shell's own widgets, which keep their services for the whole session
+SHELL_CONSUMER = "shell"
+
+
+class ServiceRegistry:
+    """
+        Services shared by the shell and its plugins.
+        A service is created the first time it is acquired and torn down once its last consumer releases it,
+        so subsystems nobody uses cost no sockets, threads or memory.
+    """
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+            # fabric has no API to stop it, it runs until the shell exits
+            cls._instance.register("hyprland", Hyprland)
+            cls._instance.register("hyprland_state", cls._instance._create_hyprland_state, cls._instance._stop_hyprland_state)
+            cls._instance.register("jobs", JobManager.from_config, JobManager.shutdown)
+        return cls._instance
+
+    def __init__(self):
+        # Name -> (factory, teardown)
+        self._factories: Dict[str, Tuple[Callable[[], Any], Callable[[Any], None] | None]] = {}
+        self._services: Dict[str, Any] = {}
+        self._consumers: Dict[str, Set[str]] = {}
+
+    def register(self, name: str, factory: Callable[[], Any], teardown: Callable[[Any], None] | None = None):
+        """
+        Declare a service without creating it. Registering a name again replaces its factory,
+        a running instance is kept until it is released.
+
+        :param teardown: Called with the instance once its last consumer releases it
+        """
+        self._factories[name] = (factory, teardown)
+
+    def acquire(self, name: str, consumer: str) -> Any:
+        """Return the service, creating it if needed. Acquiring it again with the same consumer is a no-op."""
+        if name not in self._services:
+            if name not in self._factories:
+                raise KeyError(f"unknown service `{name}`")
+            factory, _ = self._factories[name]
+            self._services[name] = factory()
+            logger.debug(f"[Services] Started `{name}` for `{consumer}`.")
+
+        self._consumers.setdefault(name, set()).add(consumer)
+        return self._services[name]
+
+    def get(self, name: str) -> Any | None:
+        """Return the service if it is running, without acquiring it."""
+        return self._services.get(name)
+
+    def release(self, name: str, consumer: str):
+        consumers = self._consumers.get(name)
+        if not consumers or consumer not in consumers:
+            return
+
+        consumers.discard(consumer)
+        if consumers:
+            return
+
+        del self._consumers[name]
+        service = self._services.pop(name)
+        _, teardown = self._factories.get(name, (None, None))
+        if teardown is not None:
+            try:
+                teardown(service)
+            except Exception as e:
+                logger.warning(f"[Services] Error stopping `{name}`: {e}")
+        logger.debug(f"[Services] Stopped `{name}`, it has no consumers left.")
+
+    def release_all(self, consumer: str):
+        for name in [name for name, consumers in self._consumers.items() if consumer in consumers]:
+            self.release(name, consumer)
+
+    def get_running(self) -> Dict[str, List[str]]:
+        """Running services and their consumers."""
+        return {name: sorted(consumers) for name, consumers in self._consumers.items()}
+
+    def _create_hyprland_state(self) -> HyprlandState:
+        return HyprlandState(self.acquire("hyprland", "hyprland_state"))
+
+    def _stop_hyprland_state(self, state: HyprlandState):
+        state.stop()
+        self.release("hyprland", "hyprland_state")
 
-connection: Hyprland | None = None
 
 def get_hyprland_connection() -> Hyprland:
-    global connection
-    if not connection:
-        connection = Hyprland()
+    return ServiceRegistry.get_instance().acquire("hyprland", SHELL_CONSUMER)
+
+
+def get_hyprland_state() -> HyprlandState:
+    return ServiceRegistry.get_instance().acquire("hyprland_state", SHELL_CONSUMER)
+
 
-    return connection
+def get_job_manager() -> JobManager:
+    return ServiceRegistry.get_instance().acquire("jobs", SHELL_CONSUMER)
@@ -0,0 +1,55 @@
+import gi
+gi.require_versions({"Gio": "2.0"})
+from gi.repository import Gio, GLib
+from loguru import logger
+from typing import Callable, List
+
+
+def spawn_async(argv: List[str], on_error: Callable[[str], None] | None = None) -> bool:
+    """
+    Spawn `argv` without waiting for it. If the process fails, `on_error` is called later on the main loop
+    (failures are logged either way).
+    Its output is discarded rather than piped: launch helpers pass their stdio on to the app they start,
+    and we'd be holding the app's output until it exits.
+
+    :param argv: Command and arguments
+    :param on_error: Called with the error message if the process can't be spawned or exits with an error
+    :return: Whether the process could be spawned
+    """
+
+    def report(message: str):
+        logger.error(f"[Spawn] `{' '.join(argv)}` failed: {message}")
+        if on_error is not None:
+            on_error(message)
+
+    try:
+        process = Gio.Subprocess.new(argv, Gio.SubprocessFlags.STDOUT_SILENCE | Gio.SubprocessFlags.STDERR_SILENCE)
+    except GLib.Error as e:
+        report(e.message)
+        return False
+
+    def on_finished(process: Gio.Subprocess, result: Gio.AsyncResult):
+        try:
+            process.wait_check_finish(result)
+        except GLib.Error as e:
+            report(e.message)
+
+    process.wait_check_async(None, on_finished)
+    return True
+
+
+def get_launch_argv(app_id: str, path: str | None = None) -> List[str] | None:
+    """
+    Command that launches a desktop entry in a helper process, or `None` if the entry can't be found.
+    Prefers `uwsm app`, which runs the app as its own systemd service (like `run.sh` does for the shell).
+    In service mode the helper returns once the unit has started, so its exit status is uwsm's, not the app's.
+    Falls back to `gio launch`, which also handles D-Bus activatable apps but only takes a desktop file path.
+    """
+    if GLib.find_program_in_path("uwsm") is not None:
+        return ["uwsm", "app", "-t", "service", "--", app_id]
+
+    if path is None and (app_info := Gio.DesktopAppInfo.new(app_id)) is not None:
+        path = app_info.get_filename()
+    if path is None:
+        return None
+    return ["gio", "launch", path]
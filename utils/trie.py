@@ -0,0 +1,71 @@
+from typing import Dict, Generic, List, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class _TrieNode(Generic[V]):
+    __slots__ = ("children", "value", "is_word", "completions")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode[V]"] = {}
+        self.value: V | None = None
+        self.is_word = False
+        # Best words starting with this node's prefix, filled by `PrefixTrie.build`
+        self.completions: List[Tuple[str, V]] = []
+
+
+class PrefixTrie(Generic[V]):
+    """
+        Immutable trie mapping words to values.
+        Every node stores its best completions when the trie is built, so both exact lookups and
+        completions cost O(len(prefix)) no matter how many words there are.
+    """
+
+    def __init__(self, words: Dict[str, V] | None = None, max_completions: int = 8):
+        """
+        :param words: Words and their values
+        :param max_completions: Completions kept per prefix. Shorter words come first.
+        """
+        self.max_completions = max_completions
+        self._root: _TrieNode[V] = _TrieNode()
+        self._size = 0
+        self.build(words or {})
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, word: str):
+        node = self._find(word)
+        return node is not None and node.is_word
+
+    def build(self, words: Dict[str, V]):
+        self._root = _TrieNode()
+        self._size = len(words)
+
+        # Inserting in completion order lets every node keep the first `max_completions` words it sees
+        for word, value in sorted(words.items(), key=lambda item: (len(item[0]), item[0])):
+            node = self._root
+            for char in word:
+                if len(node.completions) < self.max_completions:
+                    node.completions.append((word, value))
+                node = node.children.setdefault(char, _TrieNode())
+            if len(node.completions) < self.max_completions:
+                node.completions.append((word, value))
+            node.value = value
+            node.is_word = True
+
+    def get(self, word: str) -> V | None:
+        node = self._find(word)
+        return node.value if node is not None and node.is_word else None
+
+    def complete(self, prefix: str) -> List[Tuple[str, V]]:
+        """Return up to `max_completions` `(word, value)` pairs starting with `prefix`, shortest first."""
+        node = self._find(prefix)
+        return list(node.completions) if node is not None else []
+
+    def _find(self, prefix: str) -> _TrieNode[V] | None:
+        node = self._root
+        for char in prefix:
+            if (node := node.children.get(char)) is None:
+                return None
+        return node
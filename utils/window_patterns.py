@@ -0,0 +1,179 @@
+import re
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+# Subjects a pattern can match, in the order they are tried
+SUBJECTS = ("class", "ititle", "title")
+
+# Pattern operations referring to a group by number, which changes once the pattern is combined with others
+GROUP_REFERENCES = (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS)
+
+# Literal text, or the number of a group to insert
+TemplatePart = str | int
+
+
+def _references_groups(parsed) -> bool:
+    if isinstance(parsed, sre_parse.SubPattern):
+        return any(op in GROUP_REFERENCES or _references_groups(value) for op, value in parsed)
+    if isinstance(parsed, (tuple, list)):
+        return any(_references_groups(item) for item in parsed)
+    return False
+
+
+class WindowPatternRule:
+    """A `window_pattern_list` entry with its regex compiled and its `$N` template parsed."""
+
+    __slots__ = ("index", "pattern", "regex", "subject", "result", "template", "groups", "combinable")
+
+    def __init__(self, index: int, pattern: str, result: str):
+        self.index = index
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.groups = self.regex.groups
+        parsed = sre_parse.parse(pattern)
+        self.subject = self._get_subject(parsed)
+        # Backreferences would point at another rule's groups, and inline flags must start the whole pattern
+        self.combinable = not _references_groups(parsed) and self._compiles_wrapped()
+        self.result = result
+        self.template = self._parse_template(result)
+
+    def _get_subject(self, parsed: sre_parse.SubPattern) -> str | None:
+        """
+        Patterns starting with `class:`, `ititle:` or `title:` can only match that subject.
+        Read from the parsed pattern rather than its text: `class:a|title:b` matches both subjects,
+        while the parser factors the common prefix out of `class:a|class:b`.
+        """
+        prefix = []
+        for op, value in parsed:
+            if op != sre_parse.LITERAL:
+                break
+            prefix.append(chr(value))
+        prefix = "".join(prefix)
+        return next((subject for subject in SUBJECTS if prefix.startswith(f"{subject}:")), None)
+
+    def _compiles_wrapped(self) -> bool:
+        try:
+            re.compile(f"(?P<rule{self.index}>{self.pattern})")
+        except re.error:
+            return False
+        return True
+
+    def _parse_template(self, result: str) -> List[TemplatePart]:
+        """
+        Same as replacing `$1`, `$2`... in turn, the way `window_pattern_list` was always applied:
+        `$10` is group 1 followed by `0`, and references to groups the pattern doesn't have are kept as they are.
+        """
+        parts: List[TemplatePart] = [result]
+        for group in range(1, self.groups + 1):
+            reference = f"${group}"
+            split: List[TemplatePart] = []
+            for part in parts:
+                if isinstance(part, int) or reference not in part:
+                    split.append(part)
+                    continue
+                for position, text in enumerate(part.split(reference)):
+                    if position:
+                        split.append(group)
+                    split.append(text)
+            parts = split
+        return [part for part in parts if part != ""]
+
+    def expand(self, match: re.Match, offset: int = 0) -> str:
+        values = [match.group(group + offset) or "" for group in range(1, self.groups + 1)]
+        if any("$" in value for value in values):
+            # Replacing in turn also substitutes `$N` that earlier groups brought in
+            result = self.result
+            for group, value in enumerate(values, 1):
+                result = result.replace(f"${group}", value)
+            return result.strip()
+
+        return "".join(part if isinstance(part, str) else values[part - 1] for part in self.template).strip()
+
+
+class WindowTitleRewriter:
+    """
+        Turns a window's class and titles into the label shown by `ActiveWindow`, following `window_pattern_list`.
+        The rules that can match each subject are compiled into a single alternation, so a lookup is at most three
+        regex matches however long the list is, and results are memoized per window. Rules that can't be combined,
+        e.g. with backreferences, are tried one by one next to it.
+        The first rule matching, in list order, wins, as when the rules were tried one by one.
+    """
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            from config import window_pattern_list
+            cls._instance = cls(window_pattern_list)
+        return cls._instance
+
+    def __init__(self, patterns: Dict[str, str], cache_size: int = 256):
+        self.rules = [
+            WindowPatternRule(index, pattern, result) for index, (pattern, result) in enumerate(patterns.items())
+        ]
+        # Subject -> (combined regex or None, group name -> (rule, group offset), rules to try one by one)
+        self._dispatch: Dict[
+            str, Tuple[re.Pattern | None, Dict[str, Tuple[WindowPatternRule, int]], List[WindowPatternRule]]
+        ] = {
+            subject: self._compile_subject([rule for rule in self.rules if rule.subject in (subject, None)])
+            for subject in SUBJECTS
+        }
+        self.rewrite = lru_cache(maxsize=cache_size)(self._rewrite)
+
+    def cache_info(self):
+        return self.rewrite.cache_info()
+
+    def _compile_subject(self, rules: List[WindowPatternRule]):
+        combined = [rule for rule in rules if rule.combinable]
+        separate = [rule for rule in rules if not rule.combinable]
+        if not combined:
+            return None, {}, separate
+
+        alternatives = []
+        names: Dict[str, Tuple[WindowPatternRule, int]] = {}
+        group = 0
+        for rule in combined:
+            group += 1
+            names[f"rule{rule.index}"] = (rule, group)
+            alternatives.append(f"(?P<rule{rule.index}>{rule.pattern})")
+            group += rule.groups
+
+        try:
+            return re.compile("|".join(alternatives)), names, separate
+        except re.error:
+            # Group names used by several rules
+            return None, {}, rules
+
+    def _match_subject(self, subject: str, text: str) -> Tuple[WindowPatternRule, re.Match, int] | None:
+        regex, names, separate = self._dispatch[subject]
+        best = None
+        if regex is not None and (match := regex.match(text)) is not None:
+            # The rule's own groups are closed before its wrapping group, so `lastgroup` is the wrapping group
+            rule, group = names[match.lastgroup]
+            best = rule, match, group
+
+        for rule in separate:
+            if best is not None and rule.index > best[0].index:
+                break
+            if (match := rule.regex.match(text)) is not None:
+                return rule, match, 0
+        return best
+
+    def _rewrite(self, win_class: str | None, win_title: str | None, win_initial_title: str | None) -> str:
+        best = None
+        for subject, value in zip(SUBJECTS, (win_class, win_initial_title, win_title)):
+            result = self._match_subject(subject, f"{subject}:{value}")
+            # Earlier rules win, then earlier subjects
+            if result is not None and (best is None or result[0].index < best[0].index):
+                best = result
+
+        if best is not None:
+            rule, match, offset = best
+            return rule.expand(match, offset)
+
+        return ((win_title[:40] + "...") if len(win_title) > 40 else win_title) if win_title is not None else "Desktop"
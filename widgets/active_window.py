@@ -1,11 +1,8 @@
-import json
-import re
-from config import window_pattern_list, workspace_pattern_list
-from fabric.hyprland.service import HyprlandEvent
-from fabric.utils import bulk_connect
+from config import workspace_pattern_list
 from fabric.widgets.button import Button
 from utils.widgets import setup_cursor_hover
-from utils.services import get_hyprland_connection
+from utils.services import get_hyprland_state
+from utils.window_patterns import WindowTitleRewriter
 
 class ActiveWindow(Button):
     def __init__(self, **kwargs):
@@ -13,35 +10,27 @@ class ActiveWindow(Button):
 
         setup_cursor_hover(self)
 
-        self.connection = get_hyprland_connection()
-        bulk_connect(
-            self.connection,
-            {
-                "event::activewindow": self.on_active_window,
-                "event::closewindow": self.on_active_window,
-                "event::workspacev2": self.on_active_window,
-                "event::focusedmonv2": self.on_active_window,
-                "event::createworkspacev2": self.on_active_window,
-                "event::destroyworkspacev2": self.on_active_window,
-                "event::urgent": self.on_active_window,
-            },
-        )
+        # Shared by every status bar and kept current from Hyprland's events, reading it costs no IPC
+        self.state = get_hyprland_state()
+        self.rewriter = WindowTitleRewriter.get_instance()
+        self._changed_handler = self.state.connect("changed", self.on_state_changed)
+        self._address: str | None = None
+        self._label: str | None = None
+        self.connect("destroy", lambda *_: self.state.disconnect(self._changed_handler))
 
         self.set_tooltip_text("Active window")
 
         self.get_window_data()
 
-    def on_active_window(self, _, event: HyprlandEvent):
-        return self.get_window_data()
+    def on_state_changed(self, _, changes):
+        # Title changes of the other windows don't show here
+        if changes.affects_active_window(self._address):
+            self.get_window_data()
 
     def get_window_data(self):
-        win_data: dict = json.loads(
-            self.connection.send_command("j/activewindow").reply.decode()
-        )
-
-        workspace_name_ref: dict = json.loads(
-            self.connection.send_command("j/activeworkspace").reply.decode()
-        )
+        win_data: dict = self.state.get_active_window() or {}
+        self._address = win_data.get("address")
+        workspace_name_ref: dict = self.state.get_active_workspace() or {"name": ""}
 
         workspace_name = win_data.get("workspace", workspace_name_ref)["name"]
 
@@ -49,10 +38,14 @@ class ActiveWindow(Button):
         win_title = win_data.get("title")
         win_initial_title = win_data.get("initialTitle")
 
-        return self.set_label(
+        label = (
             f"{workspace_pattern_list.get(workspace_name, workspace_name.zfill(2))}   "
             + self.match_window_pattern(win_class, win_title, win_initial_title)
         )
+        # Relabeling queues a resize of the whole bar, even with the same text
+        if label != self._label:
+            self._label = label
+            self.set_label(label)
 
     def match_window_pattern(
         self,
@@ -60,23 +53,4 @@ class ActiveWindow(Button):
         win_title: str | None,
         win_initial_title: str | None,
     ) -> str:
-        for pattern, result in window_pattern_list.items():
-
-            match = None
-            if (
-                (match := re.match(pattern, f"class:{win_class}"))
-                or (match := re.match(pattern, f"ititle:{win_initial_title}"))
-                or (match := re.match(pattern, f"title:{win_title}"))
-            ):
-                final_title = result
-
-                # TODO: Check if `result` includes "$" before loop the entire fucking group array
-
-                if match:
-                    for i in range(1, len(match.groups()) + 1):
-                        group = match.group(i) or ""
-                        final_title = final_title.replace(f"${i}", group)
-
-                return final_title.strip()
-
-        return ((win_title[:40] + "...") if len(win_title) > 40 else win_title) if win_title is not None else "Desktop"
+        return self.rewriter.rewrite(win_class, win_title, win_initial_title)
@@ -1,5 +1,6 @@
 from typing import Callable
 from gi.repository import GLib
+from fabric.core.service import Property, Service
 from fabric.widgets.box import Box
 from fabric.widgets.button import Button
 from fabric.widgets.image import Image
@@ -9,6 +10,67 @@ from loguru import logger
 from utils.widgets import setup_cursor_hover
 from widgets.popover import Popover
 
+class CommonButtonModel(Service):
+    """
+        State of a toolbar button, shared by the `CommonButton`s showing it on every status bar.
+        Plugins update the model once and every bound button follows.
+    """
+
+    @Property(str, "read-write")
+    def icon(self) -> str:
+        return self._icon
+
+    @icon.setter
+    def icon(self, value: str):
+        self._icon = value
+
+    @Property(str, "read-write")
+    def label(self) -> str:
+        return self._label
+
+    @label.setter
+    def label(self, value: str):
+        self._label = value
+
+    @Property(str, "read-write")
+    def title(self) -> str:
+        return self._title
+
+    @title.setter
+    def title(self, value: str):
+        self._title = value
+
+    @Property(bool, "read-write")
+    def revealed(self) -> bool:
+        return self._revealed
+
+    @revealed.setter
+    def revealed(self, value: bool):
+        self._revealed = value
+
+    @Property(bool, "read-write")
+    def pressed(self) -> bool:
+        return self._pressed
+
+    @pressed.setter
+    def pressed(self, value: bool):
+        self._pressed = value
+
+    def __init__(
+        self,
+        icon: str | None = None,
+        label: str | None = None,
+        title: str | None = None,
+        revealed: bool = True,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self._icon = icon
+        self._label = label
+        self._title = title
+        self._revealed = revealed
+        self._pressed = False
+
 class CommonButton(Button):
     """A common button to be used with the Status Bar"""
 
@@ -36,6 +98,7 @@ class CommonButton(Button):
         r_popover_factory: Callable | None = None,
         on_click: Callable | None = None,
         revealed: bool = True,
+        model: CommonButtonModel | None = None,
         **kwargs,
     ):
         """
@@ -53,6 +116,8 @@ class CommonButton(Button):
         :type l_popover_factory: Callable[Gtk.Widget]
         :param r_popover_factory: Function that returns the content for the popover that will open with right click
         :type r_popover_factory: Callable[Gtk.Widget]
+        :param model: State shared with the buttons on the other status bars. Overrides `label`, `icon`, `title` and `revealed`.
+        :type model: CommonButtonModel
         **kwargs: Additional arguments for Button
         """
         super().__init__(
@@ -60,6 +125,9 @@ class CommonButton(Button):
             **kwargs,
         )
 
+        if model is not None:
+            label, icon, title, revealed = model.label, model.icon, model.title, model.revealed
+
         self._icon = icon
         self._icon_size = icon_size
         self._label = label
@@ -119,6 +187,53 @@ class CommonButton(Button):
         self.add(self._content_box)
         self.show_all()
 
+        self._model = None
+        self._model_handlers = []
+        if model is not None:
+            self.bind_model(model)
+
+    def bind_model(self, model: CommonButtonModel):
+        """Follow `model` until this button is destroyed."""
+        self._model = model
+        self._model_handlers = [
+            model.connect("notify::icon", lambda *_: self.set_icon(model.icon)),
+            model.connect("notify::label", lambda *_: self.set_label(model.label)),
+            model.connect("notify::title", lambda *_: self.set_tooltip_text(model.title)),
+            model.connect("notify::revealed", lambda *_: self.reveal() if model.revealed else self.unreveal()),
+            model.connect("notify::pressed", lambda *_: self._on_model_pressed(model.pressed)),
+        ]
+        if model.pressed:
+            self.add_style_class("pressed")
+        # The model outlives its buttons
+        self.connect("destroy", lambda *_: self._unbind_model())
+
+    def wrap_callbacks(self, wrap: Callable[[str, Callable], Callable]):
+        """
+        Replace the click callback and the popover factories with `wrap(kind, callback)`.
+        Used by the plugin manager to time them against the owning plugin's main loop budget.
+        Popovers that were already built keep their content.
+        """
+        if self._on_click is not None:
+            self._on_click = wrap("click", self._on_click)
+        if self._l_popover_factory is not None:
+            self._l_popover_factory = wrap("popover", self._l_popover_factory)
+        if self._r_popover_factory is not None:
+            self._r_popover_factory = wrap("popover", self._r_popover_factory)
+
+    def _unbind_model(self):
+        if self._model is None:
+            return
+        for handler_id in self._model_handlers:
+            self._model.disconnect(handler_id)
+        self._model_handlers = []
+        self._model = None
+
+    def _on_model_pressed(self, pressed: bool):
+        if pressed:
+            self.add_style_class("pressed")
+        else:
+            self.remove_style_class("pressed")
+
     def _on_button_press(self, widget, event):
         # Left click
         if event.button == 1:
@@ -179,7 +294,7 @@ class CommonButton(Button):
             )
             self._content_box.pack_start(self._icon_widget, False, False, 0)
         else:
-            self._icon_widget.set_from_icon_name(icon, self._icon_size)
+            self._icon_widget.set_from_icon_name(f"{icon}-symbolic", self._icon_size)
 
         return True
 
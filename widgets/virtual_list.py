@@ -0,0 +1,127 @@
+import math
+import gi
+gi.require_versions({"Gtk": "3.0"})
+from gi.repository import Gtk
+from fabric.widgets.scrolledwindow import ScrolledWindow
+from typing import Any, Callable, List, Sequence
+
+
+class VirtualList(ScrolledWindow):
+    """
+        Scrollable list that only creates widgets for the visible rows (plus a few above and below).
+        Rows are recycled: scrolling or replacing the items rebinds the existing widgets instead of creating new ones.
+    """
+
+    def __init__(
+        self,
+        row_factory: Callable[[], Gtk.Widget],
+        row_binder: Callable[[Gtk.Widget, Any], None],
+        row_height: int,
+        overscan: int = 2,
+        **kwargs,
+    ):
+        """
+        Initialize the list.
+
+        :param row_factory: Function that creates an empty row widget
+        :type row_factory: Callable[[], Gtk.Widget]
+        :param row_binder: Function that updates a row widget to show an item
+        :type row_binder: Callable[[Gtk.Widget, Any], None]
+        :param row_height: Fixed height of every row, in pixels
+        :type row_height: int
+        :param overscan: Number of extra rows kept above and below the visible ones
+        :type overscan: int
+        **kwargs: Additional arguments for ScrolledWindow
+        """
+        super().__init__(**kwargs)
+
+        self._row_factory = row_factory
+        self._row_binder = row_binder
+        self._row_height = row_height
+        self._overscan = overscan
+
+        self._items: Sequence[Any] = []
+        self._rows: List[Gtk.Widget] = []
+        # Index of the item each row is currently bound to, -1 if none
+        self._bound_indexes: List[int] = []
+        self._width = 0
+
+        self._layout = Gtk.Layout()
+        self._layout.connect("size-allocate", self._on_layout_size_allocate)
+        self.add(self._layout)
+
+        self.get_vadjustment().connect("value-changed", lambda *_: self._update_rows())
+
+    @property
+    def items(self) -> Sequence[Any]:
+        return self._items
+
+    def set_items(self, items: Sequence[Any], keep_scroll: bool = False):
+        """
+        Replace the items. The visible rows are rebound, no widgets are created.
+
+        :param items: New items
+        :param keep_scroll: Keep the scroll position, e.g. when appending another page of items
+        """
+        self._items = items
+        self._bound_indexes = [-1] * len(self._rows)
+        self._layout.set_size(self._width, len(items) * self._row_height)
+        if not keep_scroll:
+            self.get_vadjustment().set_value(0)
+        self._update_rows()
+
+    def get_row_count(self) -> int:
+        return len(self._rows)
+
+    def _get_pool_size(self) -> int:
+        page_size = self.get_vadjustment().get_page_size() or self.get_max_content_height()
+        page_size = max(page_size, self._row_height)
+        return math.ceil(page_size / self._row_height) + 1 + self._overscan * 2
+
+    def _ensure_pool(self):
+        pool_size = self._get_pool_size()
+        if len(self._rows) >= pool_size:
+            return
+
+        while len(self._rows) < pool_size:
+            row = self._row_factory()
+            row.set_size_request(self._width, self._row_height)
+            self._layout.put(row, 0, 0)
+            self._rows.append(row)
+        # Rows are assigned by `index % pool size`, so every row has to be rebound
+        self._bound_indexes = [-1] * len(self._rows)
+
+    def _update_rows(self):
+        self._ensure_pool()
+
+        pool_size = len(self._rows)
+        first = max(int(self.get_vadjustment().get_value() // self._row_height) - self._overscan, 0)
+        last = min(first + pool_size, len(self._items))
+
+        # Item `i` is always shown by row `i % pool size`. Scrolling one row down only rebinds one widget.
+        visible = set()
+        for index in range(first, last):
+            slot = index % pool_size
+            row = self._rows[slot]
+            visible.add(slot)
+
+            if self._bound_indexes[slot] != index:
+                self._row_binder(row, self._items[index])
+                self._bound_indexes[slot] = index
+                self._layout.move(row, 0, index * self._row_height)
+            row.show()
+
+        for slot, row in enumerate(self._rows):
+            if slot not in visible:
+                row.hide()
+                self._bound_indexes[slot] = -1
+
+    def _on_layout_size_allocate(self, layout, allocation):
+        if allocation.width == self._width:
+            return
+
+        self._width = allocation.width
+        self._layout.set_size(self._width, len(self._items) * self._row_height)
+        for row in self._rows:
+            row.set_size_request(self._width, self._row_height)
+        self._update_rows()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+    Compare the old one-pattern-at-a-time matching of `window_pattern_list` with `WindowTitleRewriter`,
+    with the list scaled up to 1,000 rules.
+
+    python window_patterns_benchmark.py [rules] [windows] [lookups]
+
+    With more rules than the `re` module caches (512), the old way compiles every pattern on every lookup,
+    so it is only timed on the first `OLD_LOOKUPS` lookups.
+"""
+import random, re, sys, timeit
+from utils.window_patterns import WindowTitleRewriter
+
+OLD_LOOKUPS = 20
+
+
+def match_window_pattern(patterns, win_class, win_title, win_initial_title) -> str:
+    # What `ActiveWindow.match_window_pattern` used to do
+    for pattern, result in patterns.items():
+        if (
+            (match := re.match(pattern, f"class:{win_class}"))
+            or (match := re.match(pattern, f"ititle:{win_initial_title}"))
+            or (match := re.match(pattern, f"title:{win_title}"))
+        ):
+            final_title = result
+            for i in range(1, len(match.groups()) + 1):
+                final_title = final_title.replace(f"${i}", match.group(i) or "")
+            return final_title.strip()
+
+    return ((win_title[:40] + "...") if len(win_title) > 40 else win_title) if win_title is not None else "Desktop"
+
+
+def make_patterns(count: int):
+    patterns = {}
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            patterns[f"class:app{i}$"] = f"App {i}"
+        elif kind == 1:
+            patterns[f"title:Editor {i} .*$"] = f"Editor {i}"
+        elif kind == 2:
+            patterns[f"ititle:Player {i}$"] = f"Player {i}"
+        else:
+            patterns[f"title:(.*?) — Browser {i}$"] = f"$1 ({i})"
+    return patterns
+
+
+def make_windows(count: int, rules: int):
+    windows = []
+    for _ in range(count):
+        i = random.randrange(rules * 5 // 4)  # Some windows match no rule
+        windows.append((f"app{i}", f"Page {i} — Browser {i}", f"Player {i}"))
+    return windows
+
+
+def main():
+    rules = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    window_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    lookups = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+    random.seed(0)
+    patterns = make_patterns(rules)
+    windows = make_windows(window_count, rules)
+    # Title updates come back to the same few windows
+    sequence = [random.choice(windows) for _ in range(lookups)]
+
+    start = timeit.default_timer()
+    rewriter = WindowTitleRewriter(patterns)
+    compile_time = timeit.default_timer() - start
+
+    for win_class, win_title, win_initial_title in windows:
+        expected = match_window_pattern(patterns, win_class, win_title, win_initial_title)
+        assert rewriter.rewrite(win_class, win_title, win_initial_title) == expected, (win_class, win_title)
+
+    def run_old():
+        for win_class, win_title, win_initial_title in sequence[:OLD_LOOKUPS]:
+            match_window_pattern(patterns, win_class, win_title, win_initial_title)
+
+    def run_uncached():
+        for win_class, win_title, win_initial_title in sequence:
+            rewriter._rewrite(win_class, win_title, win_initial_title)
+
+    def run_cached():
+        for win_class, win_title, win_initial_title in sequence:
+            rewriter.rewrite(win_class, win_title, win_initial_title)
+
+    print(f"{rules} rules, {window_count} windows, {lookups} lookups (compiled in {compile_time * 1000:.1f}ms)")
+    for name, function, count in (
+        ("one by one", run_old, min(OLD_LOOKUPS, lookups)),
+        ("combined", run_uncached, lookups),
+        ("combined + cache", run_cached, lookups),
+    ):
+        elapsed = min(timeit.repeat(function, number=1, repeat=3))
+        print(f"  {name:<18} {elapsed / count * 1e6:12.2f}µs per lookup")
+
+
+if __name__ == "__main__":
+    main()